@@ -4,6 +4,13 @@ files rather than making a new instance."""
 import dash
 import dash_bootstrap_components as dbc
 
+from .config import PRECOMPUTE_ON_STARTUP, PRELOAD_MODEL_YEARS, SHARED_CACHE
+from .export import register_export_route
+from .model_registry import ModelRegistry
+from .precompute import PrecomputeCache, start_precompute
+from .result_store import ResultStore
+from .shared_cache import attach_shared_cache
+
 # Initialize app
 app = dash.Dash(
     __name__,
@@ -11,3 +18,24 @@ app = dash.Dash(
 )
 server = app.server
 app.config.suppress_callback_exceptions = True
+
+# Index saved models
+model_registry = ModelRegistry()
+
+# Scored results stay on the server; dcc.Store components only hold their keys
+result_store = ResultStore()
+register_export_route(server, result_store)
+
+# Callbacks read each fiscal year's scored data and lookup tables from precompute_cache
+precompute_cache = PrecomputeCache()
+if SHARED_CACHE:
+    # Several workers: load models before gunicorn forks and memory-map the
+    # results saved by shared_cache.py, so all workers share one copy
+    model_registry.preload(PRELOAD_MODEL_YEARS)
+    attach_shared_cache(cache=precompute_cache)
+else:
+    # Start loading the most recent years' models, and scoring every fiscal
+    # year in a process pool, in the background
+    model_registry.warm()
+    if PRECOMPUTE_ON_STARTUP:
+        start_precompute(model_registry, precompute_cache)
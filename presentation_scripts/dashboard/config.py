@@ -1 +1,53 @@
 """Code for constants used throughout the web app."""
+
+# Number of (model, test data) prediction results kept in memory
+PREDICTION_CACHE_SIZE = 32
+# Number of rows scored at a time, so large test sets don't need one huge DMatrix
+PREDICTION_BATCH_SIZE = 100_000
+# Saved models are named like churn_xgboost_2018.json in MODEL_DIRECTORY
+MODEL_DIRECTORY = "models"
+MODEL_FILENAME_PATTERN = r"churn_(?P<library>[a-z]+)_(?P<year>\d{4})\.\w+"
+# Number of models kept in memory, and number of recent years loaded at startup
+MAX_LOADED_MODELS = 3
+WARM_MODEL_YEARS = 2
+# Step size of the decision threshold slider, and every threshold it can select
+THRESHOLD_STEP = 0.01
+THRESHOLDS = [round(i * THRESHOLD_STEP, 2) for i in range(int(round(1 / THRESHOLD_STEP)) + 1)]
+# Number of result tables kept in memory on the server. If RESULT_STORE_DIRECTORY
+# is set, tables evicted from memory are kept in a temporary folder inside it as Arrow
+# files until they are used again or the server exits.
+RESULT_STORE_SIZE = 16
+RESULT_STORE_DIRECTORY = None
+# Rows written at a time when exporting results, and the URL exports are served from
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_ROUTE = "/export"
+# The scatter map shows individual donors at or above MAP_POINT_ZOOM, or when no
+# more than MAP_MAX_POINTS are selected. Otherwise donors are grouped into grid
+# cells, MAP_CELLS_PER_TILE across each map tile at the current zoom level.
+MAP_POINT_ZOOM = 9
+MAP_MAX_POINTS = 5_000
+MAP_CELLS_PER_TILE = 8
+MAP_MAX_ZOOM = 20
+# hist_fig's bins line up with the threshold slider's steps. Cumulative bin counts
+# are stored every HISTOGRAM_BLOCK_ROWS donors, sorted by giving.
+HISTOGRAM_BIN_WIDTH = THRESHOLD_STEP
+HISTOGRAM_BLOCK_ROWS = 1_024
+# Each fiscal year's test data is saved as TEST_DATA_FILENAME in TEST_DATA_DIRECTORY,
+# with the churn label in TARGET_COLUMN and the columns used to display donors
+TEST_DATA_DIRECTORY = "test_data"
+TEST_DATA_FILENAME = "churn_test_{year}.parquet"
+TARGET_COLUMN = "churn"
+DISPLAY_COLUMNS = ["id", "amount_given", "latitude", "longitude"]
+# Precompute every fiscal year when the app starts, using PRECOMPUTE_WORKERS processes
+# (None for one per CPU), and again every PRECOMPUTE_INTERVAL seconds if it isn't None
+PRECOMPUTE_ON_STARTUP = True
+PRECOMPUTE_WORKERS = None
+PRECOMPUTE_INTERVAL = None
+# Set SHARED_CACHE to run several server workers on one machine. Precomputed results
+# are written to SHARED_CACHE_DIRECTORY once and memory-mapped read-only by every worker.
+SHARED_CACHE = False
+SHARED_CACHE_DIRECTORY = "shared_cache"
+# Number of recent years' models loaded before workers fork when SHARED_CACHE is set. These
+# stay in memory even past MAX_LOADED_MODELS; None preloads every year, which saves loading
+# older models in each worker at the cost of holding all of them in memory.
+PRELOAD_MODEL_YEARS = MAX_LOADED_MODELS
@@ -0,0 +1,112 @@
+"""Code for streaming filtered results to the browser as a file download.
+
+Building the whole export in memory, e.g. as a data URI on the export link,
+fails for large selections and blocks the worker while it runs. Instead, the
+export link points at a route on the Flask server that writes the stored
+results in chunks, so the download starts right away and server memory stays
+constant."""
+
+import zlib
+from typing import Iterator
+from urllib.parse import urlencode
+
+import pandas as pd
+from flask import Flask, Response, abort, request, stream_with_context
+from werkzeug.utils import secure_filename
+
+from .config import EXPORT_CHUNK_ROWS, EXPORT_ROUTE
+from .result_store import ResultStore
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a DataFrame as CSV, a chunk of rows at a time."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+class _ChunkSink:
+    """A file-like object that collects written bytes until they are taken."""
+
+    def __init__(self) -> None:
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a DataFrame as a Parquet file, one row group at a time."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into a single gzip stream."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_url(key: str, filename: str, file_format: str = "csv", compress: bool = False) -> str:
+    """Return the URL that downloads the stored results under `key`, for the export link."""
+    query = {"filename": filename or "results", "format": file_format}
+    if compress:
+        query["gzip"] = 1
+    return f"{EXPORT_ROUTE}/{key}?{urlencode(query)}"
+
+
+def register_export_route(server: Flask, store: ResultStore) -> None:
+    """Add the streaming export route to the app's Flask server."""
+
+    @server.route(f"{EXPORT_ROUTE}/<key>")
+    def export_results(key):
+        df = store.get(key)
+        file_format = request.args.get("format", "csv")
+        if df is None or file_format not in EXPORT_FORMATS:
+            abort(404)
+        mimetype, extension = EXPORT_FORMATS[file_format]
+        chunks = iter_csv(df) if file_format == "csv" else iter_parquet(df)
+        filename = secure_filename(request.args.get("filename", "")) or "results"
+        if not filename.endswith(extension):
+            filename += extension
+        if request.args.get("gzip"):
+            chunks = gzip_chunks(chunks)
+            mimetype = "application/gzip"
+            filename += ".gz"
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
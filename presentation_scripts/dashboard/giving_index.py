@@ -0,0 +1,71 @@
+"""Code for filtering a fiscal year's scored donors by the min_gift and max_gift inputs.
+
+A boolean mask over every donor costs the same however narrow the giving range
+is. GivingLevelIndex sorts donors by giving once, so a giving range is found
+with two binary searches, and only the donors in that range are compared with
+the decision threshold."""
+
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class GivingSelection(NamedTuple):
+    donors_above: int
+    donors_below: int
+    rows: np.ndarray
+
+
+class GivingLevelIndex:
+    """Scored donors for one fiscal year, sorted by giving."""
+
+    def __init__(self, giving: Sequence[float], churn_pred: Sequence[float]) -> None:
+        giving = np.asarray(giving, dtype=float)
+        self.order = np.argsort(giving, kind="stable")
+        self.giving = giving[self.order]
+        self.churn_pred = np.asarray(churn_pred, dtype=float)[self.order]
+
+    def giving_range(
+        self, min_gift: Optional[float] = None, max_gift: Optional[float] = None
+    ) -> slice:
+        """Return the sorted positions of donors whose giving is within [min_gift, max_gift]."""
+        start = 0 if min_gift is None else np.searchsorted(self.giving, min_gift, side="left")
+        stop = len(self.giving)
+        if max_gift is not None:
+            stop = np.searchsorted(self.giving, max_gift, side="right")
+        return slice(int(start), int(max(start, stop)))
+
+    def select(
+        self,
+        threshold: float,
+        min_gift: Optional[float] = None,
+        max_gift: Optional[float] = None,
+    ) -> GivingSelection:
+        """Find the donors in a giving range who are above a decision threshold.
+
+            Finding the giving range takes O(log n) time, and comparing its k
+            donors with the threshold takes O(k).
+
+        Arguments:
+            threshold {float} -- The decision threshold. Donors whose predicted
+                churn probability is greater than or equal to it are above it.
+
+        Keyword Arguments:
+            min_gift {Optional[float]} -- The min_gift input's value (default: {None})
+            max_gift {Optional[float]} -- The max_gift input's value (default: {None})
+
+        Returns:
+            GivingSelection -- The number of donors in the giving range above
+                and below the threshold, and the row positions of those above
+                it in the scored data, in order of giving
+        """
+        selection = self.giving_range(min_gift, max_gift)
+        above = self.churn_pred[selection] >= threshold
+        n_above = int(above.sum())
+        rows = self.order[selection][above]
+        return GivingSelection(n_above, len(above) - n_above, rows)
+
+    def count(self, min_gift: Optional[float] = None, max_gift: Optional[float] = None) -> int:
+        """Return the number of donors whose giving is within [min_gift, max_gift]."""
+        selection = self.giving_range(min_gift, max_gift)
+        return selection.stop - selection.start
@@ -0,0 +1,117 @@
+"""Code for precomputing hist_fig's predicted churn probability histogram.
+
+Sending every prediction to the browser and letting Plotly bin them costs time
+and bandwidth in proportion to the number of donors. Instead, each fiscal
+year's donors are sorted by giving and assigned to fixed probability bins, and
+cumulative bin counts are stored every few thousand donors. The histogram for a
+min_gift/max_gift range is then the difference of two cumulative counts, so
+hist_fig is always a bar chart of the same few numbers."""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .config import HISTOGRAM_BIN_WIDTH, HISTOGRAM_BLOCK_ROWS
+
+
+class GivingHistogram:
+    """Churn probability bin counts for one fiscal year, for any range of giving."""
+
+    def __init__(
+        self,
+        giving: Sequence[float],
+        churn_pred: Sequence[float],
+        bin_width: float = HISTOGRAM_BIN_WIDTH,
+        block_rows: int = HISTOGRAM_BLOCK_ROWS,
+    ) -> None:
+        giving = np.asarray(giving, dtype=float)
+        order = np.argsort(giving, kind="stable")
+        self.giving = giving[order]
+        self.n_bins = int(round(1 / bin_width))
+        # i / n_bins is the same float as the slider's threshold, so a donor scored exactly
+        # at a threshold is in the bin starting there, as ThresholdSweep counts them above it
+        self.bin_edges = np.arange(self.n_bins + 1) / self.n_bins
+        bins = np.searchsorted(
+            self.bin_edges, np.asarray(churn_pred, dtype=float)[order], side="right"
+        )
+        # Probabilities of exactly 1 go in the last bin, as they do in np.histogram
+        self.bins = np.clip(bins - 1, 0, self.n_bins - 1).astype(np.int32)
+        self.block_rows = block_rows
+
+        # cumulative_counts[i] holds the bin counts of the first i * block_rows donors
+        n_blocks = len(self.bins) // block_rows
+        block_counts = np.zeros((n_blocks + 1, self.n_bins), dtype=np.int64)
+        if n_blocks:
+            block_ids = np.arange(n_blocks * block_rows) // block_rows
+            np.add.at(block_counts, (block_ids + 1, self.bins[: n_blocks * block_rows]), 1)
+        self.cumulative_counts = np.cumsum(block_counts, axis=0)
+
+    def _counts_before(self, position: int) -> np.ndarray:
+        """Return the bin counts of the first `position` donors."""
+        block = position // self.block_rows
+        remainder = self.bins[block * self.block_rows : position]
+        return self.cumulative_counts[block] + np.bincount(remainder, minlength=self.n_bins)
+
+    def counts(
+        self, min_gift: Optional[float] = None, max_gift: Optional[float] = None
+    ) -> np.ndarray:
+        """Return the bin counts of donors whose giving is within [min_gift, max_gift].
+
+        Keyword Arguments:
+            min_gift {Optional[float]} -- The minimum giving (default: {None}, no minimum)
+            max_gift {Optional[float]} -- The maximum giving (default: {None}, no maximum)
+
+        Returns:
+            np.ndarray -- The number of donors in each churn probability bin
+        """
+        start = 0 if min_gift is None else np.searchsorted(self.giving, min_gift, side="left")
+        stop = len(self.giving)
+        if max_gift is not None:
+            stop = np.searchsorted(self.giving, max_gift, side="right")
+        if stop <= start:
+            return np.zeros(self.n_bins, dtype=np.int64)
+        return self._counts_before(int(stop)) - self._counts_before(int(start))
+
+
+class HistogramBins:
+    """Precomputed GivingHistograms for each fiscal year."""
+
+    def __init__(
+        self, bin_width: float = HISTOGRAM_BIN_WIDTH, block_rows: int = HISTOGRAM_BLOCK_ROWS
+    ) -> None:
+        self.bin_width = bin_width
+        self.block_rows = block_rows
+        self.histograms: Dict[int, GivingHistogram] = {}
+
+    def add_year(
+        self, year: int, giving: Sequence[float], churn_pred: Sequence[float]
+    ) -> GivingHistogram:
+        histogram = GivingHistogram(giving, churn_pred, self.bin_width, self.block_rows)
+        self.histograms[year] = histogram
+        return histogram
+
+    def lookup(
+        self, year: int, min_gift: Optional[float] = None, max_gift: Optional[float] = None
+    ) -> pd.DataFrame:
+        """Return a fiscal year's histogram for a giving range, ready to plot as bars.
+
+        Arguments:
+            year {int} -- The fiscal year
+
+        Keyword Arguments:
+            min_gift {Optional[float]} -- The min_gift input's value (default: {None})
+            max_gift {Optional[float]} -- The max_gift input's value (default: {None})
+
+        Returns:
+            pd.DataFrame -- One row per bin, with 'bin_start', 'bin_end' and
+                'donor_count' columns
+        """
+        histogram = self.histograms[year]
+        return pd.DataFrame(
+            {
+                "bin_start": histogram.bin_edges[:-1],
+                "bin_end": histogram.bin_edges[1:],
+                "donor_count": histogram.counts(min_gift, max_gift),
+            }
+        )
@@ -9,6 +9,7 @@ import numpy as np
 from .navbar import Navbar
 from .churn_glossary import churn_glossary
 from .app import app
+from .config import THRESHOLD_STEP
 
 
 navbar = Navbar(app)
@@ -67,7 +68,7 @@ controls = (
                 id="threshold_slider",
                 min=0,
                 max=1,
-                step=0.01,
+                step=THRESHOLD_STEP,
                 value=0.37,
                 marks={num: f"{num:.2f}" for num in np.linspace(0, 1, 6)},
                 tooltip={"always_visible": False},
@@ -272,6 +273,7 @@ layout = html.Div(
     [
         churn_glossary,
         about_glamtk,
+        # These hold keys into the server-side result_store in app.py, not the results
         dcc.Store(id="results_data"),
         dcc.Store(id="selected_results_data"),
         dcc.Store(id="cm_data"),
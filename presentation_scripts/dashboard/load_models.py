@@ -1,9 +1,82 @@
 """Code for loading trained models in the web app. The TrainedModel class
 provides a unified prediction interface for models from different libraries."""
 
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
 import pandas as pd
 import xgboost as xgb
-from typing import Optional
+
+from .config import PREDICTION_BATCH_SIZE, PREDICTION_CACHE_SIZE
+
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Return a hash of a DataFrame's values, index and columns.
+
+    Hashing is much cheaper than scoring, so it is used to recognize test
+    data that has already been scored.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr((list(df.columns), df.shape)).encode())
+    return digest.hexdigest()
+
+
+def model_fingerprint(model) -> str:
+    """Return a hash of a trained model's contents.
+
+    Two models trained for the same fiscal year get different hashes, and a
+    model loaded again from the same file gets the same hash.
+    """
+    if isinstance(model, xgb.Booster):
+        contents = bytes(model.save_raw())
+    else:
+        contents = pickle.dumps(model)
+    return hashlib.blake2b(contents, digest_size=16).hexdigest()
+
+
+class PredictionCache:
+    """A thread-safe least recently used cache of prediction arrays.
+
+    Keys identify the model by a hash of its contents, not the model
+    object, so a reloaded model still hits and the cache never keeps an
+    evicted model in memory.
+    """
+
+    def __init__(self, maxsize: int = PREDICTION_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        with self._lock:
+            predictions = self._entries.get(key)
+            if predictions is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return predictions
+
+    def put(self, key: Hashable, predictions: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = predictions
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+prediction_cache = PredictionCache()
 
 
 class TrainedModel:
@@ -14,29 +87,55 @@ class TrainedModel:
         library: str,
         X_test: Optional[pd.DataFrame] = None,
         y_test: Optional[pd.Series] = None,
+        model_key: Optional[Hashable] = None,
     ) -> None:
         self.model = model
         self.year = year
         self.library = library
+        # Identifies the model in the prediction cache. By default it is a hash of the
+        # model's contents, calculated the first time the cache is used.
+        self._model_key = model_key
         self._X_test = X_test
         self._y_test = y_test
 
-    def get_predictions(self):
+    @property
+    def model_key(self) -> Hashable:
+        if self._model_key is None:
+            self._model_key = model_fingerprint(self.model)
+        return self._model_key
+
+    def get_predictions(self, use_cache: bool = True):
         if self.X_test is None or self.y_test is None:
             raise Exception("Test data not supplied.")
+        if self.library not in ("xgboost", "sklearn"):
+            raise Exception(f"Library {self.library} is not yet implemented.")
+        if use_cache:
+            # Predictions for the same model and test data never change, so reuse them.
+            # The test data is hashed on every call, in case it was changed in place.
+            key = (self.model_key, fingerprint(self.X_test))
+            predictions = prediction_cache.get(key)
+            if predictions is None:
+                predictions = self._predict_in_batches()
+                prediction_cache.put(key, predictions)
+        else:
+            predictions = self._predict_in_batches()
         if self.library == "xgboost":
-            dtest = xgb.DMatrix(self.X_test, label=self.y_test)
-            y_pred = self.model.predict(dtest)
-            y_pred = pd.DataFrame(y_pred, index=self.y_test.index)
-            y_pred.columns = ["churn_pred"]
-            return y_pred
-        if self.library == "sklearn":
-            results = pd.DataFrame(self.model.predict_proba(self.X_test), index=self.y_test.index)
-            y_pred = results.iloc[:, 1]
+            y_pred = pd.DataFrame(predictions, index=self.y_test.index, copy=True)
             y_pred.columns = ["churn_pred"]
             return y_pred
-        else:
-            raise Exception(f"Library {self.library} is not yet implemented.")
+        return pd.Series(predictions, index=self.y_test.index, name="churn_pred", copy=True)
+
+    def _predict_in_batches(self, batch_size: int = PREDICTION_BATCH_SIZE) -> np.ndarray:
+        batches = []
+        for start in range(0, len(self.X_test), batch_size):
+            X_batch = self.X_test.iloc[start : start + batch_size]
+            if self.library == "xgboost":
+                batches.append(self.model.predict(xgb.DMatrix(X_batch)))
+            else:
+                batches.append(self.model.predict_proba(X_batch)[:, 1])
+        if not batches:
+            return np.empty(0)
+        return np.concatenate(batches)
 
     @property
     def X_test(self):
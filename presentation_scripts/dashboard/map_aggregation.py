@@ -0,0 +1,141 @@
+"""Code for summarizing donors on the scatter map so the figure stays small.
+
+Sending every donor above the threshold to the browser makes the figure JSON huge
+once there are tens of thousands of points. DonorMapIndex precomputes, for one
+fiscal year, each donor's grid cell at every zoom level, and sorts donors by
+predicted churn probability so the donors above a threshold are a slice. A
+query then sums that slice by grid cell and returns one marker per cell,
+switching to individual donors once the map is zoomed in far enough."""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import MAP_CELLS_PER_TILE, MAP_MAX_POINTS, MAP_MAX_ZOOM, MAP_POINT_ZOOM
+
+
+def cell_size(zoom: int, cells_per_tile: int = MAP_CELLS_PER_TILE) -> float:
+    """Return the width of a grid cell in degrees, at a map zoom level."""
+    # A web map tile covers 360 / 2**zoom degrees of longitude
+    return 360 / (2**zoom * cells_per_tile)
+
+
+class DonorMapIndex:
+    """Grid index of one fiscal year's scored donors for the scatter map."""
+
+    def __init__(
+        self,
+        latitude: Sequence[float],
+        longitude: Sequence[float],
+        churn_pred: Sequence[float],
+        ids: Optional[Sequence] = None,
+        point_zoom: int = MAP_POINT_ZOOM,
+        max_points: int = MAP_MAX_POINTS,
+        cells_per_tile: int = MAP_CELLS_PER_TILE,
+    ) -> None:
+        churn_pred = np.asarray(churn_pred, dtype=float)
+        order = np.argsort(churn_pred, kind="stable")
+        self.churn_pred = churn_pred[order]
+        self.latitude = np.asarray(latitude, dtype=float)[order]
+        self.longitude = np.asarray(longitude, dtype=float)[order]
+        self.ids = np.arange(len(order))[order] if ids is None else np.asarray(ids)[order]
+        self.point_zoom = point_zoom
+        self.max_points = max_points
+
+        # Number each donor's grid cell at every zoom level that shows grid cells
+        self.cell_codes = []
+        self.n_cells = []
+        for zoom in range(point_zoom):
+            size = cell_size(zoom, cells_per_tile)
+            column = np.floor((self.longitude + 180) / size).astype(np.int64)
+            row = np.floor((self.latitude + 90) / size).astype(np.int64)
+            codes, cells = pd.factorize(column * (2**zoom * cells_per_tile) + row)
+            self.cell_codes.append(codes.astype(np.int32))
+            self.n_cells.append(len(cells))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, **kwargs) -> "DonorMapIndex":
+        """Build the index from a fiscal year's scored donors, with 'latitude',
+        'longitude', 'churn_pred' and optionally 'id' columns."""
+        ids = df["id"] if "id" in df.columns else None
+        return cls(df["latitude"], df["longitude"], df["churn_pred"], ids, **kwargs)
+
+    def _selection(
+        self, threshold: float, bounds: Optional[Tuple[float, float, float, float]]
+    ) -> Tuple[slice, Optional[np.ndarray]]:
+        start = int(np.searchsorted(self.churn_pred, threshold, side="left"))
+        selection = slice(start, len(self.churn_pred))
+        if bounds is None:
+            return selection, None
+        south, west, north, east = bounds
+        latitude = self.latitude[selection]
+        longitude = self.longitude[selection]
+        in_bounds = (latitude >= south) & (latitude <= north)
+        # The map's view can cross the antimeridian, where west is greater than east
+        if west <= east:
+            in_bounds &= (longitude >= west) & (longitude <= east)
+        else:
+            in_bounds &= (longitude >= west) | (longitude <= east)
+        return selection, in_bounds
+
+    def markers(
+        self,
+        threshold: float,
+        zoom: float = 0,
+        bounds: Optional[Tuple[float, float, float, float]] = None,
+    ) -> pd.DataFrame:
+        """Return the markers to draw for donors at or above a churn threshold.
+
+        Arguments:
+            threshold {float} -- The decision threshold
+
+        Keyword Arguments:
+            zoom {float} -- The map's current zoom level (default: {0})
+            bounds {Optional[Tuple[float, float, float, float]]} -- The visible
+                (south, west, north, east) edges of the map (default: {None})
+
+        Returns:
+            pd.DataFrame -- One row per marker with 'latitude', 'longitude',
+                'churn_pred' and 'donor_count' columns. Individual donors
+                also have an 'id' column and a 'donor_count' of 1; grid
+                cells are placed at their donors' average location and
+                show their average churn probability.
+        """
+        selection, in_bounds = self._selection(threshold, bounds)
+        n_selected = selection.stop - selection.start
+        if in_bounds is not None:
+            n_selected = int(in_bounds.sum())
+        zoom = min(int(zoom), MAP_MAX_ZOOM)
+        if zoom >= self.point_zoom or n_selected <= self.max_points:
+            points = pd.DataFrame(
+                {
+                    "id": self.ids[selection],
+                    "latitude": self.latitude[selection],
+                    "longitude": self.longitude[selection],
+                    "churn_pred": self.churn_pred[selection],
+                    "donor_count": 1,
+                }
+            )
+            return points if in_bounds is None else points[in_bounds]
+
+        codes = self.cell_codes[zoom][selection]
+        weights = np.ones(len(codes))
+        if in_bounds is not None:
+            weights = in_bounds.astype(float)
+        n_cells = self.n_cells[zoom]
+        counts = np.bincount(codes, weights=weights, minlength=n_cells)
+        occupied = counts > 0
+
+        def cell_mean(values):
+            totals = np.bincount(codes, weights=values * weights, minlength=n_cells)
+            return totals[occupied] / counts[occupied]
+
+        return pd.DataFrame(
+            {
+                "latitude": cell_mean(self.latitude[selection]),
+                "longitude": cell_mean(self.longitude[selection]),
+                "churn_pred": cell_mean(self.churn_pred[selection]),
+                "donor_count": counts[occupied].astype(np.int64),
+            }
+        )
@@ -0,0 +1,129 @@
+"""Code for finding saved models by fiscal year and library, loading each one the
+first time it is needed, and keeping a limited number of them in memory."""
+
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import MAX_LOADED_MODELS, MODEL_DIRECTORY, MODEL_FILENAME_PATTERN, WARM_MODEL_YEARS
+from .load_models import load_xgboost_model
+
+
+def load_sklearn_model(filename):
+    import joblib
+
+    return joblib.load(filename)
+
+
+MODEL_LOADERS = {"xgboost": load_xgboost_model, "sklearn": load_sklearn_model}
+
+
+class ModelRegistry:
+    """Index of saved models by (fiscal year, library), with lazy loading and LRU eviction.
+
+    Models are loaded the first time their year is requested. At most
+    `max_loaded` stay in memory; the least recently used is dropped when
+    another is loaded. warm() loads the most recent years in a background
+    thread so the first switch to those years doesn't wait on disk.
+    """
+
+    def __init__(
+        self,
+        model_directory: str = MODEL_DIRECTORY,
+        max_loaded: int = MAX_LOADED_MODELS,
+        loaders: Dict[str, Callable] = MODEL_LOADERS,
+    ) -> None:
+        self.max_loaded = max_loaded
+        self.loaders = loaders
+        self._paths: Dict[Tuple[int, str], Path] = {}
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple[int, str], threading.Lock] = {}
+        self.scan(model_directory)
+
+    def scan(self, model_directory: str) -> None:
+        """Index every saved model in a directory whose name matches MODEL_FILENAME_PATTERN."""
+        directory = Path(model_directory)
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.iterdir()):
+            match = re.fullmatch(MODEL_FILENAME_PATTERN, path.name)
+            if match and match["library"] in self.loaders:
+                self.register(int(match["year"]), match["library"], path)
+
+    def register(self, year: int, library: str, path: str) -> None:
+        with self._lock:
+            self._paths[(year, library)] = Path(path)
+            self._models.pop((year, library), None)
+
+    def years(self, library: Optional[str] = None) -> List[int]:
+        """Return the fiscal years with a saved model, most recent first."""
+        return sorted(
+            {year for year, lib in self._paths if library is None or lib == library},
+            reverse=True,
+        )
+
+    def model_path(self, year: int, library: str = "xgboost") -> Path:
+        with self._lock:
+            if (year, library) not in self._paths:
+                raise KeyError(f"No {library} model saved for fiscal year {year}.")
+            return self._paths[(year, library)]
+
+    def is_loaded(self, year: int, library: str = "xgboost") -> bool:
+        with self._lock:
+            return (year, library) in self._models
+
+    def get(self, year: int, library: str = "xgboost"):
+        """Return the model for a fiscal year, loading it if it isn't in memory."""
+        key = (year, library)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            if key not in self._paths:
+                raise KeyError(f"No {library} model saved for fiscal year {year}.")
+            loading_lock = self._loading.setdefault(key, threading.Lock())
+        # Only one thread loads a given model; others wait for it instead of loading it again
+        with loading_lock:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key]
+                path = self._paths[key]
+            model = self.loaders[library](str(path))
+            with self._lock:
+                self._models[key] = model
+                while len(self._models) > self.max_loaded:
+                    self._models.popitem(last=False)
+            return model
+
+    def preload(self, n_years: Optional[int] = None, library: str = "xgboost") -> None:
+        """Load the most recent fiscal years' models now and keep them in memory.
+
+        Call this before a server forks its workers, e.g. with gunicorn's
+        --preload, so the workers share the loaded models' memory. A model
+        loaded after the fork is loaded separately by every worker, so
+        max_loaded is raised to `n_years` if needed, which keeps all of the
+        preloaded models in memory at once. With `n_years` of None, every
+        year's model is preloaded.
+        """
+        years = self.years(library)
+        years = years if n_years is None else years[:n_years]
+        self.max_loaded = max(self.max_loaded, len(years))
+        for year in reversed(years):
+            self.get(year, library)
+
+    def warm(self, n_years: int = WARM_MODEL_YEARS, library: str = "xgboost") -> threading.Thread:
+        """Load the most recent fiscal years' models in a background thread."""
+        years = self.years(library)[: min(n_years, self.max_loaded)]
+
+        def load_recent_years():
+            # Load oldest first so the most recent year is the last one evicted
+            for year in reversed(years):
+                self.get(year, library)
+
+        thread = threading.Thread(target=load_recent_years, name="model-warmer", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,287 @@
+"""Code for scoring every fiscal year's test data and building everything the
+dashboard shows for it before any callback asks.
+
+Scoring a year and building its threshold table, histogram bins, giving index
+and map index takes seconds, which is too long to do inside a callback. The
+precompute job runs each fiscal year in its own process and puts the results
+in a PrecomputeCache that callbacks read from with get_or_build. A year missing
+from the cache, e.g. one whose model was added after the job ran, is built in
+the callback's process the first time it's asked for."""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from .config import (
+    DISPLAY_COLUMNS,
+    PRECOMPUTE_INTERVAL,
+    PRECOMPUTE_WORKERS,
+    TARGET_COLUMN,
+    TEST_DATA_DIRECTORY,
+    TEST_DATA_FILENAME,
+)
+from .giving_index import GivingLevelIndex
+from .histogram_bins import GivingHistogram, HistogramBins
+from .load_models import TrainedModel
+from .map_aggregation import DonorMapIndex
+from .model_registry import MODEL_LOADERS, ModelRegistry
+from .threshold_sweep import ThresholdSweep, build_threshold_table
+
+
+class YearResults(NamedTuple):
+    scored: pd.DataFrame
+    threshold_table: pd.DataFrame
+    histogram: GivingHistogram
+    giving_index: GivingLevelIndex
+    map_index: Optional[DonorMapIndex]
+    timings: Dict[str, float]
+
+
+def _feature_columns(model, df: pd.DataFrame) -> list:
+    """Return the columns a model was trained on, or every non-display column if it doesn't say."""
+    names = getattr(model, "feature_names", None)
+    if names is None:
+        names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return list(names)
+    return [column for column in df.columns if column not in DISPLAY_COLUMNS + [TARGET_COLUMN]]
+
+
+def build_year(year: int, library: str, model_path: str, test_path: str) -> YearResults:
+    """Score one fiscal year's test data and build its lookup tables.
+
+    Arguments:
+        year {int} -- The fiscal year
+        library {str} -- The model's library, a key of MODEL_LOADERS
+        model_path {str} -- Path to the saved model
+        test_path {str} -- Path to a Parquet file of test data with the
+            model's features, TARGET_COLUMN and DISPLAY_COLUMNS
+
+    Returns:
+        YearResults -- The scored donors, lookup tables and the seconds spent
+            on each step
+    """
+    timings = {}
+    start = last = time.perf_counter()
+
+    def record(step):
+        nonlocal last
+        now = time.perf_counter()
+        timings[step] = now - last
+        last = now
+
+    model = MODEL_LOADERS[library](model_path)
+    df = pd.read_parquet(test_path)
+    record("load")
+
+    X_test = df[_feature_columns(model, df)]
+    y_test = df[TARGET_COLUMN]
+    trained_model = TrainedModel(model, year, library, X_test, y_test)
+    # Each process scores a year once, so caching predictions would only use memory
+    churn_pred = np.asarray(trained_model.get_predictions(use_cache=False)).ravel()
+    scored = df[[column for column in DISPLAY_COLUMNS if column in df.columns]].copy()
+    scored[TARGET_COLUMN] = y_test.to_numpy()
+    scored["churn_pred"] = churn_pred
+    record("score")
+
+    giving = scored["amount_given"].to_numpy() if "amount_given" in scored else None
+    threshold_table = build_threshold_table(churn_pred, y_test.to_numpy(), giving)
+    record("threshold_table")
+    giving = np.zeros(len(scored)) if giving is None else giving
+    histogram = GivingHistogram(giving, churn_pred)
+    record("histogram")
+    giving_index = GivingLevelIndex(giving, churn_pred)
+    record("giving_index")
+    map_index = None
+    if {"latitude", "longitude"} <= set(scored.columns):
+        map_index = DonorMapIndex.from_frame(scored)
+    record("map_index")
+    timings["total"] = last - start
+    return YearResults(scored, threshold_table, histogram, giving_index, map_index, timings)
+
+
+class PrecomputeCache:
+    """Precomputed results by fiscal year, with hit and miss counts for callback lookups.
+
+    Threshold tables and histograms are also added to a ThresholdSweep and
+    HistogramBins, so callbacks can use their lookup methods. Only get and
+    get_or_build count as lookups; results() reads without counting, for
+    code such as build_shared_cache that isn't serving a callback.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.sweep = ThresholdSweep()
+        self.histogram_bins = HistogramBins()
+        self._results: Dict[int, YearResults] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[int, threading.Lock] = {}
+
+    def put(self, year: int, results: YearResults) -> None:
+        with self._lock:
+            self._results[year] = results
+            self.sweep.set_year(year, results.threshold_table)
+            self.histogram_bins.histograms[year] = results.histogram
+
+    def get(self, year: int) -> Optional[YearResults]:
+        with self._lock:
+            results = self._results.get(year)
+            if results is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return results
+
+    def get_or_build(
+        self,
+        year: int,
+        registry: ModelRegistry,
+        library: str = "xgboost",
+        test_data_directory: str = TEST_DATA_DIRECTORY,
+    ) -> YearResults:
+        """Return a fiscal year's results, building and caching them on a miss.
+
+            Concurrent misses for the same year wait for one build rather
+            than each running build_year. The hit rate is printed after
+            each build.
+
+        Arguments:
+            year {int} -- The fiscal year
+            registry {ModelRegistry} -- The saved models
+
+        Keyword Arguments:
+            library {str} -- The model's library (default: {'xgboost'})
+            test_data_directory {str} -- Directory holding each year's test data
+                (default: {TEST_DATA_DIRECTORY})
+
+        Returns:
+            YearResults -- The year's results
+        """
+        results = self.get(year)
+        if results is not None:
+            return results
+        with self._lock:
+            build_lock = self._build_locks.setdefault(year, threading.Lock())
+        with build_lock:
+            with self._lock:
+                results = self._results.get(year)
+            if results is None:
+                test_path = Path(test_data_directory) / TEST_DATA_FILENAME.format(year=year)
+                results = build_year(
+                    year, library, str(registry.model_path(year, library)), str(test_path)
+                )
+                self.put(year, results)
+                print(
+                    f"Built fiscal year {year} on demand in {results.timings['total']:.1f}s. "
+                    f"Cache hit rate: {self.hit_rate:.0%} ({self.hits} hits, {self.misses} misses)"
+                )
+        return results
+
+    def results(self) -> Dict[int, YearResults]:
+        """Return every cached year's results, without counting a lookup."""
+        with self._lock:
+            return dict(self._results)
+
+    def years(self) -> list:
+        with self._lock:
+            return sorted(self._results, reverse=True)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def precompute_years(
+    registry: ModelRegistry,
+    cache: PrecomputeCache,
+    years: Optional[Iterable[int]] = None,
+    library: str = "xgboost",
+    test_data_directory: str = TEST_DATA_DIRECTORY,
+    max_workers: Optional[int] = PRECOMPUTE_WORKERS,
+) -> Dict[int, Dict[str, float]]:
+    """Build every fiscal year's results in a process pool and put them in the cache.
+
+        Years without saved test data are skipped. Per-year timings are
+        printed when the job finishes.
+
+    Arguments:
+        registry {ModelRegistry} -- The saved models
+        cache {PrecomputeCache} -- The cache callbacks read from
+
+    Keyword Arguments:
+        years {Optional[Iterable[int]]} -- Fiscal years to build (default: {every
+            year with a saved model})
+        library {str} -- The models' library (default: {'xgboost'})
+        test_data_directory {str} -- Directory holding each year's test data
+            (default: {TEST_DATA_DIRECTORY})
+        max_workers {Optional[int]} -- Number of processes (default: {PRECOMPUTE_WORKERS})
+
+    Returns:
+        Dict[int, Dict[str, float]] -- The seconds spent on each step, by fiscal year
+    """
+    jobs = {}
+    for year in registry.years(library) if years is None else years:
+        test_path = Path(test_data_directory) / TEST_DATA_FILENAME.format(year=year)
+        if test_path.exists():
+            jobs[year] = (year, library, str(registry.model_path(year, library)), str(test_path))
+    if not jobs:
+        return {}
+
+    start = time.perf_counter()
+    timings = {}
+    # Forking while another thread, e.g. the model warmer, holds a lock inside xgboost
+    # can deadlock the child, so start fresh interpreters instead
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {executor.submit(build_year, *job): year for year, job in jobs.items()}
+        for future in as_completed(futures):
+            year = futures[future]
+            try:
+                results = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                # One bad year shouldn't stop the others; get_or_build can still build it
+                print(f"Precompute failed for fiscal year {year}: {error!r}")
+                continue
+            cache.put(year, results)
+            timings[year] = results.timings
+
+    for year in sorted(timings):
+        steps = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings[year].items())
+        print(f"Precomputed fiscal year {year}: {steps}")
+    print(
+        f"Precomputed {len(timings)} of {len(jobs)} fiscal years in "
+        f"{time.perf_counter() - start:.1f}s"
+    )
+    return timings
+
+
+def start_precompute(
+    registry: ModelRegistry,
+    cache: PrecomputeCache,
+    interval: Optional[float] = PRECOMPUTE_INTERVAL,
+    **kwargs,
+) -> threading.Thread:
+    """Run precompute_years in a background thread, repeating every `interval` seconds.
+
+    Keyword arguments are passed on to precompute_years. With an `interval`
+    of None the job runs once.
+    """
+
+    def run():
+        while True:
+            precompute_years(registry, cache, **kwargs)
+            if interval is None:
+                return
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="precompute", daemon=True)
+    thread.start()
+    return thread
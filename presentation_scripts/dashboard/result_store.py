@@ -0,0 +1,106 @@
+"""Code for keeping scored results on the server instead of in the browser.
+
+A dcc.Store serializes its data to JSON and sends it to the browser and back
+with every callback that uses it. For a table of scored donors that is many
+megabytes per interaction. Instead, callbacks put the table in the result store
+and save only the returned key in the dcc.Store; dependent callbacks use the key
+to get the table back on the server."""
+
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+from .config import RESULT_STORE_DIRECTORY, RESULT_STORE_SIZE
+from .load_models import fingerprint
+
+
+class ResultStore:
+    """A least recently used store of DataFrames keyed by a hash of their contents.
+
+    Tables are kept in memory and returned without copying, so treat them
+    as read-only. With a directory, tables evicted from memory are written
+    as Arrow IPC files to a temporary folder inside it. A spilled table is
+    read back into memory, and its file deleted, the next time it's asked
+    for. The folder is deleted by close, which runs when the process exits.
+    """
+
+    def __init__(
+        self, maxsize: int = RESULT_STORE_SIZE, directory: Optional[str] = RESULT_STORE_DIRECTORY
+    ) -> None:
+        self.maxsize = maxsize
+        self.directory = None
+        if directory is not None:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            # Each store gets its own folder, so one process's cleanup can't remove another's files
+            self.directory = Path(tempfile.mkdtemp(prefix="result_store_", dir=directory))
+            atexit.register(self.close)
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, df: pd.DataFrame) -> str:
+        """Store a DataFrame and return the key to save in a dcc.Store."""
+        key = fingerprint(df)
+        with self._lock:
+            self._add(key, df)
+        return key
+
+    def _add(self, key: str, df: pd.DataFrame) -> None:
+        self._tables[key] = df
+        self._tables.move_to_end(key)
+        if self.directory is not None:
+            # The table is in memory again, so a spilled copy is out of date
+            self._path(key).unlink(missing_ok=True)
+        while len(self._tables) > self.maxsize:
+            old_key, old_df = self._tables.popitem(last=False)
+            if self.directory is not None:
+                self._write(old_key, old_df)
+
+    def get(self, key: Optional[str]) -> Optional[pd.DataFrame]:
+        """Return the DataFrame stored under a key, or None if it is unknown or was evicted."""
+        if key is None:
+            return None
+        with self._lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                return self._tables[key]
+            if self.directory is not None and self._path(key).exists():
+                df = self._read(key)
+                self._add(key, df)
+                return df
+        return None
+
+    def close(self) -> None:
+        """Drop every table and delete the spill folder."""
+        with self._lock:
+            self._tables.clear()
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.arrow"
+
+    def _write(self, key: str, df: pd.DataFrame) -> None:
+        import pyarrow as pa
+
+        path = self._path(key)
+        if path.exists():
+            return
+        table = pa.Table.from_pandas(df)
+        temp_path = path.with_suffix(".tmp")
+        with pa.OSFile(str(temp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        temp_path.replace(path)
+
+    def _read(self, key: str) -> pd.DataFrame:
+        """Read a spilled table into memory. to_pandas copies it, so the file can be deleted."""
+        import pyarrow as pa
+
+        with pa.memory_map(str(self._path(key)), "r") as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
@@ -0,0 +1,157 @@
+"""Code for sharing precomputed results between several server workers.
+
+Each gunicorn worker is a separate process, so by default each one loads every
+model, precomputes every fiscal year and keeps its own copy of the results.
+In the shared mode, the results are written to SHARED_CACHE_DIRECTORY once, as
+Arrow and .npy files, and every worker memory-maps them read-only. The
+operating system keeps one copy of the files' pages for all workers, so adding
+a worker costs little extra memory and a new worker starts without scoring
+anything. Build the cache, then start the workers with --preload so models are
+loaded once before forking, after setting SHARED_CACHE in config.py:
+
+    python -m dashboard.shared_cache
+    gunicorn --preload --workers 4 dashboard.app:server
+"""
+
+import json
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .config import SHARED_CACHE_DIRECTORY
+from .giving_index import GivingLevelIndex
+from .histogram_bins import GivingHistogram
+from .map_aggregation import DonorMapIndex
+from .model_registry import ModelRegistry
+from .precompute import PrecomputeCache, YearResults, precompute_years
+
+# Lookup objects in YearResults that are saved attribute by attribute
+INDEX_TYPES = {
+    "histogram": GivingHistogram,
+    "giving_index": GivingLevelIndex,
+    "map_index": DonorMapIndex,
+}
+
+
+def _write_table(df: pd.DataFrame, path: Path) -> None:
+    table = pa.Table.from_pandas(df)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path: Path) -> pd.DataFrame:
+    # Numeric columns without missing values point straight into the memory map
+    source = pa.memory_map(str(path), "r")
+    return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+def _write_index(index, directory: Path) -> None:
+    """Save an object's array attributes as .npy files and the rest as JSON."""
+    directory.mkdir()
+    attributes = {}
+    for name, value in vars(index).items():
+        if isinstance(value, np.ndarray):
+            np.save(directory / f"{name}.npy", value)
+            attributes[name] = {"array": True}
+        elif isinstance(value, list) and value and isinstance(value[0], np.ndarray):
+            for i, array in enumerate(value):
+                np.save(directory / f"{name}_{i}.npy", array)
+            attributes[name] = {"arrays": len(value)}
+        else:
+            attributes[name] = {"value": value}
+    (directory / "attributes.json").write_text(json.dumps(attributes))
+
+
+def _read_index(cls, directory: Path):
+    """Rebuild an object saved with _write_index, with its arrays memory-mapped."""
+    index = cls.__new__(cls)
+    attributes = json.loads((directory / "attributes.json").read_text())
+    for name, saved in attributes.items():
+        if "array" in saved:
+            value = np.load(directory / f"{name}.npy", mmap_mode="r")
+        elif "arrays" in saved:
+            value = [
+                np.load(directory / f"{name}_{i}.npy", mmap_mode="r")
+                for i in range(saved["arrays"])
+            ]
+        else:
+            value = saved["value"]
+        setattr(index, name, value)
+    return index
+
+
+def write_year(directory: str, year: int, results: YearResults) -> None:
+    """Save one fiscal year's precomputed results, replacing any saved before.
+
+    The year is written to a temporary directory and renamed into place,
+    so workers never see a partly written year.
+    """
+    year_directory = Path(directory) / str(year)
+    temp_directory = Path(directory) / f".{year}.tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    temp_directory.mkdir(parents=True)
+    _write_table(results.scored, temp_directory / "scored.arrow")
+    _write_table(results.threshold_table, temp_directory / "threshold_table.arrow")
+    for field, cls in INDEX_TYPES.items():
+        index = getattr(results, field)
+        if index is not None:
+            _write_index(index, temp_directory / field)
+    (temp_directory / "timings.json").write_text(json.dumps(results.timings))
+    shutil.rmtree(year_directory, ignore_errors=True)
+    temp_directory.rename(year_directory)
+
+
+def read_year(directory: str, year: int) -> YearResults:
+    """Attach to one fiscal year's saved results without copying them into memory."""
+    year_directory = Path(directory) / str(year)
+    indexes = {
+        field: (
+            _read_index(cls, year_directory / field) if (year_directory / field).is_dir() else None
+        )
+        for field, cls in INDEX_TYPES.items()
+    }
+    return YearResults(
+        scored=_read_table(year_directory / "scored.arrow"),
+        threshold_table=_read_table(year_directory / "threshold_table.arrow"),
+        timings=json.loads((year_directory / "timings.json").read_text()),
+        **indexes,
+    )
+
+
+def build_shared_cache(
+    registry: ModelRegistry, directory: str = SHARED_CACHE_DIRECTORY, **kwargs
+) -> PrecomputeCache:
+    """Precompute every fiscal year and save the results for workers to attach to.
+
+    Keyword arguments are passed on to precompute_years.
+    """
+    cache = PrecomputeCache()
+    precompute_years(registry, cache, **kwargs)
+    for year, results in cache.results().items():
+        write_year(directory, year, results)
+    return cache
+
+
+def attach_shared_cache(
+    directory: str = SHARED_CACHE_DIRECTORY, cache: Optional[PrecomputeCache] = None
+) -> PrecomputeCache:
+    """Fill a PrecomputeCache with every fiscal year saved by build_shared_cache."""
+    if not Path(directory).is_dir():
+        raise FileNotFoundError(
+            f"No shared cache found at '{directory}'. Run 'python -m dashboard.shared_cache' "
+            "to build it before starting the server, or set SHARED_CACHE to False."
+        )
+    cache = PrecomputeCache() if cache is None else cache
+    for path in sorted(Path(directory).iterdir()):
+        if path.is_dir() and path.name.isdigit():
+            cache.put(int(path.name), read_year(directory, int(path.name)))
+    return cache
+
+
+if __name__ == "__main__":
+    build_shared_cache(ModelRegistry())
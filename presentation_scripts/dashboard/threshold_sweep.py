@@ -0,0 +1,117 @@
+"""Code for precomputing everything the dashboard shows for each decision threshold.
+
+The donor counts, giving totals and confusion matrix all depend on the threshold
+slider. Rather than recounting every donor whenever the slider moves, each
+fiscal year's predictions are sorted once and cumulative sums give the values
+for every threshold the slider can select. Slider callbacks then look up a row."""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .config import THRESHOLD_STEP, THRESHOLDS
+
+SWEEP_COLUMNS = [
+    "donors_below",
+    "donors_above",
+    "giving_below",
+    "giving_above",
+    "true_positives",
+    "false_positives",
+    "true_negatives",
+    "false_negatives",
+]
+
+
+def build_threshold_table(
+    churn_pred: Sequence[float],
+    churn_actual: Optional[Sequence[int]] = None,
+    giving: Optional[Sequence[float]] = None,
+    thresholds: Sequence[float] = THRESHOLDS,
+) -> pd.DataFrame:
+    """Count donors and giving above and below every threshold with one sort.
+
+        A donor is above a threshold, i.e. predicted to churn, when their
+        predicted churn probability is greater than or equal to it.
+
+    Arguments:
+        churn_pred {Sequence[float]} -- Predicted churn probabilities
+
+    Keyword Arguments:
+        churn_actual {Optional[Sequence[int]]} -- Actual churn labels, used for
+            the confusion matrix columns (default: {None})
+        giving {Optional[Sequence[float]]} -- Each donor's giving, used for the
+            giving columns (default: {None})
+        thresholds {Sequence[float]} -- Thresholds to precompute (default: {THRESHOLDS})
+
+    Returns:
+        pd.DataFrame -- One row per threshold, indexed by threshold
+    """
+    churn_pred = np.asarray(churn_pred, dtype=float)
+    order = np.argsort(churn_pred, kind="stable")
+    sorted_pred = churn_pred[order]
+    thresholds = np.asarray(thresholds, dtype=float)
+    below = np.searchsorted(sorted_pred, thresholds, side="left")
+    n_donors = len(churn_pred)
+
+    def sum_below(values):
+        cumulative = np.concatenate([[0], np.cumsum(np.asarray(values)[order])])
+        return cumulative[below], cumulative[-1]
+
+    table = {"donors_below": below, "donors_above": n_donors - below}
+    if giving is not None:
+        giving_below, total_giving = sum_below(np.asarray(giving, dtype=float))
+        table["giving_below"] = giving_below
+        table["giving_above"] = total_giving - giving_below
+    if churn_actual is not None:
+        churned_below, total_churned = sum_below(np.asarray(churn_actual, dtype=np.int64))
+        table["false_negatives"] = churned_below
+        table["true_negatives"] = below - churned_below
+        table["true_positives"] = total_churned - churned_below
+        table["false_positives"] = (n_donors - below) - (total_churned - churned_below)
+    table = pd.DataFrame(table, index=pd.Index(thresholds, name="threshold"))
+    return table[[column for column in SWEEP_COLUMNS if column in table]]
+
+
+class ThresholdSweep:
+    """Precomputed threshold tables for each fiscal year, with constant-time lookups."""
+
+    def __init__(self, step: float = THRESHOLD_STEP) -> None:
+        self.step = step
+        self.tables: Dict[int, pd.DataFrame] = {}
+        self._values: Dict[int, np.ndarray] = {}
+
+    def add_year(
+        self,
+        year: int,
+        churn_pred: Sequence[float],
+        churn_actual: Optional[Sequence[int]] = None,
+        giving: Optional[Sequence[float]] = None,
+    ) -> pd.DataFrame:
+        thresholds = np.round(np.arange(0, 1 + self.step / 2, self.step), 2)
+        table = build_threshold_table(churn_pred, churn_actual, giving, thresholds)
+        self.set_year(year, table)
+        return table
+
+    def set_year(self, year: int, table: pd.DataFrame) -> None:
+        """Use a table already built with build_threshold_table, e.g. by precompute.py."""
+        self.tables[year] = table
+        self._values[year] = table.to_numpy()
+
+    def lookup(self, year: int, threshold: float) -> Dict[str, float]:
+        """Return the precomputed values for the slider position closest to `threshold`."""
+        position = int(round(threshold / self.step))
+        position = min(max(position, 0), len(self._values[year]) - 1)
+        return dict(zip(self.tables[year].columns, self._values[year][position]))
+
+    def confusion_matrix(self, year: int, threshold: float) -> np.ndarray:
+        """Return [[TN, FP], [FN, TP]], the layout sklearn's confusion_matrix uses."""
+        row = self.lookup(year, threshold)
+        return np.array(
+            [
+                [row["true_negatives"], row["false_positives"]],
+                [row["false_negatives"], row["true_positives"]],
+            ],
+            dtype=np.int64,
+        )
@@ -0,0 +1,139 @@
+"""Code for imputing missing values from statistics of each row's group, e.g. the mean
+latitude of a donor's district. The statistics are fit once and saved, so later
+batches of records are imputed without recalculating them."""
+
+import json
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Define constants used in the code below
+STRATEGIES = {"mean", "median", "mode"}
+
+
+class GroupedImputer:
+    """Fill missing values with their group's mean, median or most common value.
+
+    Statistics for every column are fit with one groupby (plus one count for
+    'mode' columns) and stored in arrays aligned with the group categories.
+    Filling a batch looks up each row's group code once and takes every
+    column's fill value from those codes, so there is no per-column map or
+    second fillna pass. Rows with a missing or unseen group, or whose group
+    has no statistic, get the column's fill value instead.
+    """
+
+    def __init__(
+        self,
+        group_column: str,
+        strategies: Dict[str, str],
+        fill_values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        unknown = set(strategies.values()) - STRATEGIES
+        if unknown:
+            raise ValueError(f"Unknown strategies {unknown}. Use one of {STRATEGIES}.")
+        self.group_column = group_column
+        self.strategies = strategies
+        self.fill_values = {} if fill_values is None else fill_values
+        self.groups: Optional[pd.Index] = None
+        self.statistics: Dict[str, np.ndarray] = {}
+
+    def fit(self, df: pd.DataFrame) -> "GroupedImputer":
+        """Calculate each group's statistics from the non-missing values in `df`.
+
+        Arguments:
+            df {pd.DataFrame} -- A DataFrame with the group column and every
+                column in `strategies`
+
+        Returns:
+            GroupedImputer -- The fitted imputer
+        """
+        grouped = df.groupby(self.group_column, observed=True, sort=True)
+        aggregations = {
+            column: (column, strategy)
+            for column, strategy in self.strategies.items()
+            if strategy != "mode"
+        }
+        statistics = grouped.agg(**aggregations) if aggregations else pd.DataFrame()
+        self.groups = pd.Index(sorted(df[self.group_column].dropna().unique()))
+        statistics = statistics.reindex(self.groups)
+
+        for column, strategy in self.strategies.items():
+            if strategy == "mode":
+                counts = df.groupby([self.group_column, column], observed=True).size()
+                # Ties go to the smallest value, as with Series.mode
+                counts = counts[counts > 0].sort_index().sort_values(ascending=False, kind="stable")
+                modes = counts.reset_index().drop_duplicates(self.group_column)
+                self.statistics[column] = (
+                    modes.set_index(self.group_column)[column].reindex(self.groups).to_numpy()
+                )
+            else:
+                self.statistics[column] = statistics[column].to_numpy()
+        return self
+
+    def _fill_array(self, column: str) -> np.ndarray:
+        """Return the column's statistics followed by its fill value, for unknown groups."""
+        fill_value = self.fill_values.get(column, np.nan)
+        statistics = self.statistics[column]
+        fill = np.append(statistics.astype(object), fill_value)
+        fill[:-1][pd.isna(statistics)] = fill_value
+        if pd.api.types.is_numeric_dtype(statistics.dtype) and not pd.isna(fill).all():
+            return fill.astype(float)
+        return fill
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fill the missing values in `df` in place.
+
+            Group codes are found once for all columns. A code of -1, for a
+            missing or unseen group, picks the fill value at the end of each
+            column's array of statistics.
+
+        Arguments:
+            df {pd.DataFrame} -- A batch of records with the group column
+
+        Returns:
+            pd.DataFrame -- `df`, with its missing values filled
+        """
+        if self.groups is None:
+            raise ValueError("The imputer must be fit before it can transform data.")
+        codes = pd.Categorical(df[self.group_column], categories=self.groups).codes
+        for column in self.strategies:
+            missing = df[column].isna().to_numpy()
+            if not missing.any():
+                continue
+            fill = self._fill_array(column)[codes[missing]]
+            if pd.api.types.is_numeric_dtype(df[column]) and fill.dtype.kind == "f":
+                df.loc[missing, column] = fill
+            else:
+                df[column] = df[column].where(~missing, pd.Series(fill, index=df.index[missing]))
+        return df
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fit the imputer on `df`, then fill its missing values in place."""
+        return self.fit(df).transform(df)
+
+    def save(self, path: str) -> None:
+        """Save the fitted statistics to a JSON file."""
+        state = {
+            "group_column": self.group_column,
+            "strategies": self.strategies,
+            "fill_values": self.fill_values,
+            "groups": self.groups.tolist(),
+            "statistics": {column: values.tolist() for column, values in self.statistics.items()},
+        }
+        with open(path, "w") as file:
+            json.dump(state, file)
+
+    @classmethod
+    def load(cls, path: str) -> "GroupedImputer":
+        """Load an imputer saved with save."""
+        with open(path) as file:
+            state = json.load(file)
+        imputer = cls(state["group_column"], state["strategies"], state["fill_values"])
+        imputer.groups = pd.Index(state["groups"])
+        imputer.statistics = {
+            column: pd.Series(values, dtype=None if values else float).to_numpy()
+            for column, values in state["statistics"].items()
+        }
+        return imputer
@@ -5,9 +5,12 @@ import random
 import pandas as pd
 import numpy as np
 
+from missing_data_profiler import clean_chunks, profile_chunks
+
 # Define constants used in the code below
 RANDOM_SEED = 888
 N_ROWS = 100
+CHUNK_ROWS = 25
 
 # Set random seed for reproducible results
 np.random.seed(RANDOM_SEED)
@@ -30,3 +33,15 @@ df_dropped_nas = df.dropna(axis=0, subset=["graduation_year"]).astype({"graduati
 print(
     f"Rows before dropping missing data: {len(df)}\nRows after dropping missing data: {len(df_dropped_nas)}"
 )
+
+# Profile and drop missing data one chunk at a time, as for an extract too large to load at once
+# clean_file does the same for a CSV or Parquet file, writing the cleaned rows to another file
+policy = {"graduation_year": "drop"}
+chunks = [df.iloc[start : start + CHUNK_ROWS] for start in range(0, len(df), CHUNK_ROWS)]
+profile = profile_chunks(chunks, policy)
+df_chunked = pd.concat(clean_chunks(chunks, policy, profile)).astype({"graduation_year": int})
+
+print(
+    f"Missing data by column:\n{profile.missing_counts}\n"
+    f"Rows after dropping missing data one chunk at a time: {len(df_chunked)}"
+)
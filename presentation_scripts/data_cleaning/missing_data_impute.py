@@ -3,6 +3,8 @@
 import pandas as pd
 import numpy as np
 
+from spatial_imputer import NearestDistrictImputer
+
 
 # Define constants used in the code below
 RANDOM_SEED = 888
@@ -52,27 +54,29 @@ df["longitude"] = df["longitude"].mask(
     (mask_array < 0.1) | ((mask_array > 0.7) & (mask_array < 0.8))
 )
 
-print(f"Missing data by column before imputing:\n{df.isna().sum()}")
-
+# Some donors have a geocoded address but no district
+df["district"] = df["district"].mask((mask_array > 0.5) & (mask_array < 0.6))
+districts_removed = df["district"].isna() & df["latitude"].notna() & df["longitude"].notna()
 
-# Create values to fill in missing data by averaging each district's latitude and longitude
-district_means = df.groupby("district").agg({"latitude": "mean", "longitude": "mean"})
+print(f"Missing data by column before imputing:\n{df.isna().sum()}")
 
 
-# Fill in (impute) missing values for each district
-df_imputed = df.copy()
-df_imputed["latitude"] = df_imputed["latitude"].fillna(
-    df["district"].map(district_means["latitude"])
+# Fill in (impute) missing districts for rows with lat/lon, using the districts of the
+# nearest donors and district centers
+# Then fill in missing lat/lon with the average of each district's latitude and longitude
+# Rows with no district data are filled with a location off the East Coast for visibility
+# and easy filtering. This is one way to find donors who need addresses
+# The fitted imputer can be reused to fill new records in batches
+imputer = NearestDistrictImputer(
+    district_centers,
+    fill_values={"latitude": MISSING_DISTRICT_LATITUDE, "longitude": MISSING_DISTRICT_LONGITUDE},
 )
-df_imputed["longitude"] = df_imputed["longitude"].fillna(
-    df["district"].map(district_means["longitude"])
-)
-
+df_imputed = imputer.fit_transform(df)
 
-# Fill in (impute) lat/lon for rows with no district data
-# This data is off the East Coast for visibility and easy filtering
-# This is one way to find donors who need addresses
-df_imputed["latitude"] = df_imputed["latitude"].fillna(MISSING_DISTRICT_LATITUDE)
-df_imputed["longitude"] = df_imputed["longitude"].fillna(MISSING_DISTRICT_LONGITUDE)
+# Store the cleaned data with compact dtypes to save memory
+df_imputed = df_imputed.astype(
+    {"id": "int32", "district": "category", "latitude": "float32", "longitude": "float32"}
+)
 
 print(f"Missing data by column after imputing:\n{df_imputed.isna().sum()}")
+print(f"Districts imputed from lat/lon:\n{df_imputed.loc[districts_removed, 'district':]}")
@@ -0,0 +1,281 @@
+"""Code for profiling and cleaning missing data in a constituent extract that is too
+large to load into one DataFrame. The extract is read in chunks twice: once to
+count missing values, and once to drop or fill them and write the cleaned rows.
+Memory use depends on the chunk size, not the size of the extract."""
+
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+
+# Define constants used in the code below
+CHUNK_SIZE = 500_000
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+# A column's policy is 'drop' to drop rows missing it, 'mean' or 'mode' to fill it
+# with that statistic of the whole extract, or any other value to fill it with
+DROP = "drop"
+STATISTIC_POLICIES = {"mean", "mode"}
+
+
+def _common_dtype(first, second):
+    """Return a dtype that can hold values of both dtypes, e.g. float64 for int64 and float64."""
+    if first == second:
+        return first
+    numeric = [np.dtype(dtype) for dtype in (first, second) if isinstance(dtype, np.dtype)]
+    if len(numeric) == 2 and all(dtype.kind in "iuf" for dtype in numeric):
+        return np.result_type(*numeric)
+    return np.dtype(object)
+
+
+class MissingDataProfile:
+    """Missing value counts for an extract, accumulated one chunk at a time.
+
+    Keeps each column's missing count, the number of rows missing each
+    pair of columns together (the diagonal is each column's own count),
+    and, with a group column, each group's missing counts. Columns given
+    in `mean_columns` and `mode_columns` also keep their sums or value
+    counts, so their statistics can be used to fill missing values. Each
+    column's dtype is widened to fit every chunk, since a chunk of
+    integers with a missing value is read as floats.
+    """
+
+    def __init__(
+        self,
+        group_column: Optional[str] = None,
+        mean_columns: Iterable[str] = (),
+        mode_columns: Iterable[str] = (),
+    ) -> None:
+        self.group_column = group_column
+        self.mean_columns = list(mean_columns)
+        self.mode_columns = list(mode_columns)
+        self.columns: Optional[pd.Index] = None
+        self.dtypes: Dict[str, Any] = {}
+        self.rows_read = 0
+        self.seconds = 0.0
+        self._co_missing: Optional[np.ndarray] = None
+        self._group_missing: Optional[pd.DataFrame] = None
+        self._group_rows: Optional[pd.Series] = None
+        self._sums = pd.Series(0.0, index=self.mean_columns)
+        self._counts = pd.Series(0, index=self.mean_columns)
+        self._value_counts = {column: pd.Series(dtype="int64") for column in self.mode_columns}
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        start = time.perf_counter()
+        if self.columns is None:
+            self.columns = chunk.columns
+            self._co_missing = np.zeros((len(chunk.columns), len(chunk.columns)), dtype=np.int64)
+        for column, dtype in chunk.dtypes.items():
+            self.dtypes[column] = _common_dtype(self.dtypes.get(column, dtype), dtype)
+        missing = chunk[self.columns].isna()
+        missing_values = missing.to_numpy(dtype=np.int64)
+        self._co_missing += missing_values.T @ missing_values
+
+        if self.group_column is not None:
+            groups = chunk[self.group_column]
+            group_missing = missing.groupby(groups, dropna=False, observed=True).sum()
+            group_rows = groups.value_counts(dropna=False)
+            if self._group_missing is None:
+                self._group_missing = group_missing
+                self._group_rows = group_rows
+            else:
+                self._group_missing = self._group_missing.add(group_missing, fill_value=0)
+                self._group_rows = self._group_rows.add(group_rows, fill_value=0)
+
+        if self.mean_columns:
+            self._sums += chunk[self.mean_columns].sum()
+            self._counts += chunk[self.mean_columns].count()
+        for column in self.mode_columns:
+            counts = chunk[column].value_counts()
+            self._value_counts[column] = self._value_counts[column].add(counts, fill_value=0)
+        self.rows_read += len(chunk)
+        self.seconds += time.perf_counter() - start
+
+    @property
+    def missing_counts(self) -> pd.Series:
+        return pd.Series(np.diag(self._co_missing), index=self.columns)
+
+    @property
+    def missing_rates(self) -> pd.Series:
+        return self.missing_counts / self.rows_read if self.rows_read else self.missing_counts * 0.0
+
+    @property
+    def co_missing(self) -> pd.DataFrame:
+        """Return the number of rows missing both columns, for every pair of columns."""
+        return pd.DataFrame(self._co_missing, index=self.columns, columns=self.columns)
+
+    @property
+    def group_missing_rates(self) -> Optional[pd.DataFrame]:
+        """Return each group's share of rows missing each column, with a row for a missing group."""
+        if self._group_missing is None:
+            return None
+        rows = self._group_rows.reindex(self._group_missing.index)
+        return self._group_missing.div(rows, axis=0)
+
+    def statistics(self) -> Dict[str, Any]:
+        """Return the mean of each mean column and the most common value of each mode column."""
+        statistics = (self._sums / self._counts).to_dict()
+        for column, counts in self._value_counts.items():
+            if not counts.empty:
+                # Ties go to the smallest value, as with Series.mode
+                statistics[column] = counts.sort_index().idxmax()
+        return statistics
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+
+def read_chunks(
+    path: str, chunksize: int = CHUNK_SIZE, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Read a CSV or Parquet extract in chunks."""
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def write_chunks(chunks: Iterable[pd.DataFrame], path: str) -> int:
+    """Write chunks with the same columns and dtypes to one CSV or Parquet file.
+
+    Returns the number of rows written.
+    """
+    rows_written = 0
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows_written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            rows_written += len(chunk)
+    return rows_written
+
+
+def profile_chunks(
+    chunks: Iterable[pd.DataFrame],
+    policy: Optional[Dict[str, Any]] = None,
+    group_column: Optional[str] = None,
+    total_rows: Optional[int] = None,
+) -> MissingDataProfile:
+    """Count missing values in an iterable of chunks.
+
+    Arguments:
+        chunks {Iterable[pd.DataFrame]} -- Chunks of the extract
+
+    Keyword Arguments:
+        policy {Optional[Dict[str, Any]]} -- The policy that will be applied
+            with clean_chunks, so the statistics it needs are kept (default: {None})
+        group_column {Optional[str]} -- Column to break down missing rates by (default: {None})
+        total_rows {Optional[int]} -- Number of rows, if known, for the progress bar (default: {None})
+
+    Returns:
+        MissingDataProfile -- The accumulated profile
+    """
+    policy = {} if policy is None else policy
+    profile = MissingDataProfile(
+        group_column,
+        mean_columns=[column for column, rule in policy.items() if rule == "mean"],
+        mode_columns=[column for column, rule in policy.items() if rule == "mode"],
+    )
+    with tqdm(total=total_rows, unit="rows", unit_scale=True, desc="Profiling") as progress:
+        for chunk in chunks:
+            profile.update(chunk)
+            progress.update(len(chunk))
+    return profile
+
+
+def clean_chunks(
+    chunks: Iterable[pd.DataFrame], policy: Dict[str, Any], profile: MissingDataProfile
+) -> Iterator[pd.DataFrame]:
+    """Apply a drop/fill policy to each chunk.
+
+    Arguments:
+        chunks {Iterable[pd.DataFrame]} -- Chunks of the extract
+        policy {Dict[str, Any]} -- Each column's policy: 'drop', 'mean', 'mode'
+            or a value to fill missing values with
+        profile {MissingDataProfile} -- A profile from profile_chunks with the
+            same policy, for its statistics
+
+    Yields:
+        pd.DataFrame -- The cleaned chunks
+    """
+    drop_columns = [
+        column for column, rule in policy.items() if isinstance(rule, str) and rule == DROP
+    ]
+    statistics = profile.statistics()
+    fill_values = {
+        column: statistics[column] if isinstance(rule, str) and rule in STATISTIC_POLICIES else rule
+        for column, rule in policy.items()
+        if not (isinstance(rule, str) and rule == DROP)
+    }
+    for chunk in chunks:
+        if drop_columns:
+            chunk = chunk.dropna(subset=drop_columns)
+        # Give every chunk the same dtypes, so they can be written to one file
+        yield chunk.fillna(fill_values).astype(profile.dtypes)
+
+
+def clean_file(
+    path: str,
+    output_path: str,
+    policy: Dict[str, Any],
+    group_column: Optional[str] = None,
+    chunksize: int = CHUNK_SIZE,
+) -> MissingDataProfile:
+    """Profile missing data in an extract, then write a cleaned copy one chunk at a time.
+
+        The extract is read twice, so the statistics used to fill missing
+        values come from the whole extract. The missing counts and the
+        throughput of each pass are printed.
+
+    Arguments:
+        path {str} -- Path to a .csv (optionally compressed) or .parquet extract
+        output_path {str} -- Path to write the cleaned .csv or .parquet file to
+        policy {Dict[str, Any]} -- Each column's policy: 'drop', 'mean', 'mode'
+            or a value to fill missing values with
+
+    Keyword Arguments:
+        group_column {Optional[str]} -- Column to break down missing rates by (default: {None})
+        chunksize {int} -- Number of rows read at a time (default: {CHUNK_SIZE})
+
+    Returns:
+        MissingDataProfile -- The profile of the original extract
+    """
+    start = time.perf_counter()
+    profile = profile_chunks(read_chunks(path, chunksize), policy, group_column)
+    profile_seconds = time.perf_counter() - start
+    print(f"Missing data by column:\n{profile.missing_counts}")
+
+    start = time.perf_counter()
+    cleaned = clean_chunks(read_chunks(path, chunksize), policy, profile)
+    rows_written = write_chunks(tqdm(cleaned, unit="chunks", desc="Cleaning"), output_path)
+    clean_seconds = time.perf_counter() - start
+
+    rows = profile.rows_read
+    print(
+        f"Profiled {rows:,} rows in {profile_seconds:.1f}s "
+        f"({rows / profile_seconds if profile_seconds else 0:,.0f} rows/sec). "
+        f"Cleaned and wrote {rows_written:,} rows ({rows - rows_written:,} dropped) in "
+        f"{clean_seconds:.1f}s ({rows / clean_seconds if clean_seconds else 0:,.0f} rows/sec)"
+    )
+    return profile
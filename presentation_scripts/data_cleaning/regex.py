@@ -1,5 +1,7 @@
 """Code for matching, filtering, and transforming text with regular expressions."""
 
+import re
+
 import pandas as pd
 import numpy as np
 
@@ -37,6 +39,8 @@ df = pd.DataFrame(
         "degree": np.random.choice([k for k in DEGREES], size=N_ROWS),
     }
 )
+# Store repeated strings as a categorical to save memory
+df = df.astype({"id": "int32", "degree": "category"})
 
 
 # Flag degree types with regex patterns
@@ -46,10 +50,29 @@ def flag_degrees(df, pattern, flag_column_name):
     return result
 
 
-alumni_jd = flag_degrees(df, JD["pattern"], JD["flag_column_name"])
-alumni_llm = flag_degrees(df, LLM["pattern"], LLM["flag_column_name"])
-alumni_sjd = flag_degrees(df, SJD["pattern"], SJD["flag_column_name"])
+# Flag every degree type at once
+# Degree names repeat, so each pattern only needs to be checked against each
+# distinct degree once. The categorical codes then copy the flags to every row.
+def flag_all_degrees(df, degree_types, column="degree"):
+    degrees = df[column].astype("category")
+    patterns = [re.compile(degree_type["pattern"]) for degree_type in degree_types]
+    flag_table = np.array(
+        [
+            [pattern.search(degree) is not None for pattern in patterns]
+            for degree in degrees.cat.categories
+        ],
+        dtype="uint8",
+    ).reshape(-1, len(patterns))
+    # Missing degrees have a code of -1, which points at an extra row of zeros
+    flag_table = np.vstack([flag_table, np.zeros(len(patterns), dtype="uint8")])
+    flags = flag_table[degrees.cat.codes.to_numpy()]
+    flag_columns = [degree_type["flag_column_name"] for degree_type in degree_types]
+    return df.assign(**dict(zip(flag_columns, flags.T)))
+
+
+alumni = flag_all_degrees(df, [JD, LLM, SJD])
+alumni_jd = alumni[alumni["degree_jd"] == 1]
+alumni_llm = alumni[alumni["degree_llm"] == 1]
+alumni_sjd = alumni[alumni["degree_sjd"] == 1]
 
-alumni_jd.head()
-alumni_llm.head()
-alumni_sjd.head()
+alumni.head()
@@ -0,0 +1,182 @@
+"""Code for imputing a donor's district from their coordinates, and their coordinates
+from a location key such as their district. District centers and donors whose
+district is known are indexed in a KD-tree, so millions of records are assigned
+to their nearest district in one batched query."""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from grouped_imputer import GroupedImputer
+
+
+# Define constants used in the code below
+NEAREST_NEIGHBORS = 5
+# Known points farther than this from a location don't vote on its district
+MAX_NEIGHBOR_DISTANCE_KM = 150
+EARTH_RADIUS_KM = 6371
+
+
+def to_unit_vectors(latitude: Sequence[float], longitude: Sequence[float]) -> np.ndarray:
+    """Convert latitudes and longitudes to points on a unit sphere.
+
+    Straight-line distances between the points increase with distance along
+    the Earth's surface, so the nearest point is also the nearest location,
+    even across the antimeridian.
+    """
+    latitude = np.radians(np.asarray(latitude, dtype=float))
+    longitude = np.radians(np.asarray(longitude, dtype=float))
+    return np.column_stack(
+        [
+            np.cos(latitude) * np.cos(longitude),
+            np.cos(latitude) * np.sin(longitude),
+            np.sin(latitude),
+        ]
+    )
+
+
+class NearestDistrictImputer:
+    """Fill missing districts from coordinates, and missing coordinates from a location key.
+
+    A missing district is chosen by the nearest known points, which are the
+    district centers plus every donor with a district and coordinates, each
+    voting with a weight of one over its distance. Points farther than
+    `max_distance_km` don't vote, and locations with no points that close
+    get the nearest district center instead. Building the KD-tree over m points takes O(m log m),
+    and each query takes O(log m). Missing coordinates are the average
+    coordinates of donors with the same key, or the district's center.
+    `fill_values` optionally gives 'latitude' and 'longitude' for rows with
+    no key.
+    """
+
+    def __init__(
+        self,
+        district_centers: Dict[str, List[float]],
+        district_column: str = "district",
+        key_column: str = "district",
+        n_neighbors: int = NEAREST_NEIGHBORS,
+        max_distance_km: float = MAX_NEIGHBOR_DISTANCE_KM,
+        fill_values: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.district_centers = district_centers
+        self.district_column = district_column
+        self.key_column = key_column
+        self.n_neighbors = n_neighbors
+        self.max_distance_km = max_distance_km
+        self.fill_values = fill_values
+        self.districts: Optional[pd.Index] = None
+        self.tree: Optional[cKDTree] = None
+        self.center_tree: Optional[cKDTree] = None
+        self.point_districts: Optional[np.ndarray] = None
+        self.coordinate_imputer: Optional[GroupedImputer] = None
+
+    def fit(self, df: pd.DataFrame) -> "NearestDistrictImputer":
+        """Index the district centers and the donors in `df` with a district and coordinates.
+
+        Arguments:
+            df {pd.DataFrame} -- A DataFrame with the district, key, 'latitude'
+                and 'longitude' columns
+
+        Returns:
+            NearestDistrictImputer -- The fitted imputer
+        """
+        known = df[[self.district_column, "latitude", "longitude"]].dropna()
+        self.districts = pd.Index(
+            sorted(set(self.district_centers) | set(known[self.district_column]))
+        )
+        centers = pd.DataFrame.from_dict(
+            self.district_centers, orient="index", columns=["latitude", "longitude"]
+        )
+        latitude = np.concatenate([centers["latitude"], known["latitude"]])
+        longitude = np.concatenate([centers["longitude"], known["longitude"]])
+        self.point_districts = np.concatenate(
+            [
+                self.districts.get_indexer(centers.index),
+                self.districts.get_indexer(known[self.district_column]),
+            ]
+        )
+        self.tree = cKDTree(to_unit_vectors(latitude, longitude))
+        self.center_tree = cKDTree(to_unit_vectors(centers["latitude"], centers["longitude"]))
+
+        # Keys without any donors' coordinates fall back to their district's center
+        self.coordinate_imputer = GroupedImputer(
+            self.key_column, {"latitude": "mean", "longitude": "mean"}, self.fill_values
+        ).fit(df)
+        if self.key_column == self.district_column:
+            self._add_district_centers(centers)
+        return self
+
+    def _add_district_centers(self, centers: pd.DataFrame) -> None:
+        imputer = self.coordinate_imputer
+        groups = imputer.groups.union(centers.index)
+        for column in ["latitude", "longitude"]:
+            statistics = pd.Series(imputer.statistics[column], index=imputer.groups)
+            statistics = statistics.reindex(groups).fillna(centers[column])
+            imputer.statistics[column] = statistics.to_numpy()
+        imputer.groups = groups
+
+    def nearest_districts(
+        self, latitude: Sequence[float], longitude: Sequence[float]
+    ) -> np.ndarray:
+        """Return each location's district, as described in the class docstring."""
+        if self.tree is None:
+            raise ValueError("The imputer must be fit before it can find districts.")
+        points = to_unit_vectors(latitude, longitude)
+        n_neighbors = min(self.n_neighbors, self.tree.n)
+        # Distances between points on the unit sphere are chords, not arcs
+        max_chord = 2 * np.sin(self.max_distance_km / (2 * EARTH_RADIUS_KM))
+        distances, neighbors = self.tree.query(
+            points, k=n_neighbors, distance_upper_bound=max_chord, workers=-1
+        )
+        distances = distances.reshape(len(points), -1)
+        neighbors = neighbors.reshape(len(points), -1)
+        # Missing neighbors have an infinite distance and an index of tree.n
+        close = np.isfinite(distances)
+        neighbor_districts = np.where(
+            close, self.point_districts[np.minimum(neighbors, self.tree.n - 1)], -1
+        )
+        weights = np.where(close, 1 / np.maximum(distances, 1e-9), 0)
+        # Total each location's weights by district, and credit the total to each
+        # neighbor in that district
+        matches = neighbor_districts[:, :, np.newaxis] == neighbor_districts[:, np.newaxis, :]
+        votes = (matches * weights[:, np.newaxis, :]).sum(axis=2)
+        winners = neighbor_districts[np.arange(len(votes)), votes.argmax(axis=1)]
+
+        far = ~close.any(axis=1)
+        if far.any():
+            _, nearest_centers = self.center_tree.query(points[far], workers=-1)
+            winners[far] = self.point_districts[nearest_centers]
+        return self.districts.to_numpy()[winners]
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fill missing districts and coordinates in `df` in place.
+
+            Districts are filled first, for rows with coordinates. Then
+            coordinates are filled for rows with a key. Rows with neither
+            get the coordinates in `fill_values`, if any.
+
+        Arguments:
+            df {pd.DataFrame} -- A batch of records
+
+        Returns:
+            pd.DataFrame -- `df`, with its missing values filled
+        """
+        has_coordinates = df["latitude"].notna() & df["longitude"].notna()
+        needs_district = (df[self.district_column].isna() & has_coordinates).to_numpy()
+        if needs_district.any():
+            districts = self.nearest_districts(
+                df.loc[needs_district, "latitude"], df.loc[needs_district, "longitude"]
+            )
+            if isinstance(df[self.district_column].dtype, pd.CategoricalDtype):
+                new_districts = set(districts) - set(df[self.district_column].cat.categories)
+                df[self.district_column] = df[self.district_column].cat.add_categories(
+                    sorted(new_districts)
+                )
+            df.loc[needs_district, self.district_column] = districts
+        return self.coordinate_imputer.transform(df)
+
+    def fit_transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Fit the imputer on `df`, then fill its missing values in place."""
+        return self.fit(df).transform(df)
@@ -1,7 +1,7 @@
 """Code for aggregating data using the groupby method on a pandas DataFrame."""
 
-import pandas as pd
-import numpy as np
+from schema import apply_schema
+from synthetic_data import generate_gift_history
 
 
 # Define constants used in the code below
@@ -12,26 +12,8 @@ MAX_GIFTS_PER_YEAR = 6
 YEARS = [year for year in range(1990, 2022)]
 
 
-# Set random seed for reproducible results
-np.random.seed(RANDOM_SEED)
-
 # Create dataset
-df = pd.DataFrame()
-
-for donor_id in range(ID_COUNT):
-    start_year = np.random.choice(YEARS)
-    donor_years = list(range(start_year, 2022))
-    years_given = np.ma.array(
-        donor_years, mask=(np.array([np.random.random() for _ in donor_years]) < NULL_PCT)
-    ).compressed()
-    years_given = np.repeat(
-        years_given, np.random.randint(1, MAX_GIFTS_PER_YEAR, size=len(years_given))
-    )
-    gifts = np.round(np.random.exponential(scale=250, size=len(years_given)), 2)
-    temp_df = pd.DataFrame(
-        data={"id": donor_id + 1000, "fiscal_year": years_given, "amount_given": gifts}
-    )
-    df = pd.concat([df, temp_df], ignore_index=True)
+df = generate_gift_history(ID_COUNT, YEARS, NULL_PCT, MAX_GIFTS_PER_YEAR, seed=RANDOM_SEED)
 
 
 # Aggregate data
@@ -45,5 +27,6 @@ aggregated_df = (
     )
     .reset_index()
 )
+aggregated_df = apply_schema(aggregated_df, label="Aggregated gifts")
 
 print(aggregated_df.head(10))
@@ -0,0 +1,78 @@
+"""Code for reading and writing CSV or Parquet files one chunk at a time, so files too
+large to load into one DataFrame can be processed with memory bounded by the chunk
+size."""
+
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+
+# Define constants used in the code below
+CHUNK_SIZE = 1_000_000
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+
+def is_parquet(path: str) -> bool:
+    return Path(path).suffix.lower() in PARQUET_SUFFIXES
+
+
+def read_chunks(
+    path: str, chunksize: int = CHUNK_SIZE, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """Read a CSV or Parquet file in chunks.
+
+    Arguments:
+        path {str} -- Path to a .csv (optionally compressed) or .parquet file
+
+    Keyword Arguments:
+        chunksize {int} -- Number of rows in each chunk (default: {CHUNK_SIZE})
+        columns {Optional[List[str]]} -- Columns to read. Reading only the
+            columns needed saves time and memory (default: {None})
+
+    Yields:
+        pd.DataFrame -- Chunks of the file
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def write_chunks(chunks: Iterable[pd.DataFrame], path: str) -> int:
+    """Write chunks to one CSV or Parquet file, replacing any file already there.
+
+        Every chunk must have the same columns and dtypes as the first.
+
+    Arguments:
+        chunks {Iterable[pd.DataFrame]} -- The chunks to write
+        path {str} -- Path to a .csv (optionally compressed) or .parquet file
+
+    Returns:
+        int -- The number of rows written
+    """
+    rows_written = 0
+    if is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows_written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            rows_written += len(chunk)
+    return rows_written
@@ -1,7 +1,10 @@
 """Code for creating the target variable for churn analysis."""
 
-import pandas as pd
-import numpy as np
+from churn_labels import label_churn
+from donor_years import fill_donor_year_ranges
+from feature_store import read_features, write_features
+from schema import apply_schema
+from synthetic_data import generate_gift_history
 
 
 # Define constants used in the code below
@@ -10,28 +13,16 @@ ID_COUNT = 1000
 NULL_PCT = 0.15
 MAX_GIFTS_PER_YEAR = 6
 YEARS = [year for year in range(1990, 2022)]
+CHURN_DEFINITIONS = {
+    "churn": {"lapse_years": 1},
+    "churn_2_years": {"lapse_years": 2},
+    "churn_50_pct_drop": {"drop_pct": 0.5},
+}
+FEATURE_SET_NAME = "churn_targets"
 
 
-# Set random seed for reproducible results
-# np.random.seed(RANDOM_SEED)
-
 # Create dataset
-df = pd.DataFrame()
-
-for donor_id in range(ID_COUNT):
-    start_year = np.random.choice(YEARS)
-    donor_years = list(range(start_year, 2022))
-    years_given = np.ma.array(
-        donor_years, mask=(np.array([np.random.random() for _ in donor_years]) < NULL_PCT)
-    ).compressed()
-    years_given = np.repeat(
-        years_given, np.random.randint(1, MAX_GIFTS_PER_YEAR, size=len(years_given))
-    )
-    gifts = np.round(np.random.exponential(scale=250, size=len(years_given)), 2)
-    temp_df = pd.DataFrame(
-        data={"id": donor_id + 1000, "fiscal_year": years_given, "amount_given": gifts}
-    )
-    df = pd.concat([df, temp_df], ignore_index=True)
+df = generate_gift_history(ID_COUNT, YEARS, NULL_PCT, MAX_GIFTS_PER_YEAR, seed=None)
 
 
 # Aggregate data
@@ -43,23 +34,23 @@ aggregated_df = (
     )
     .reset_index()
 )
+aggregated_df = apply_schema(aggregated_df, label="Aggregated gifts")
 
-# Fill in fiscal years without gifts
-aggregated_df = aggregated_df.set_index(["id", "fiscal_year"])
-aggregated_df = aggregated_df.unstack(level=["fiscal_year"], fill_value=0).stack(
-    level=["fiscal_year"], dropna=False
-)
-
+# Fill in fiscal years without gifts, starting with each donor's first gift
+aggregated_df = fill_donor_year_ranges(aggregated_df).reset_index(drop=True)
 
-# Calculate churn
-def calculate_churn(df):
-    result = df.copy()
-    result["next_year_amount"] = result.groupby("id")["amount_given"].shift(-1).fillna(0)
-    return np.where(((result["next_year_amount"] <= 0) & (result["amount_given"] > 0)), 1, 0)
 
+# Calculate churn, plus other churn definitions as alternative targets, in one pass
+aggregated_df = aggregated_df.join(label_churn(aggregated_df, CHURN_DEFINITIONS))
+aggregated_df = apply_schema(aggregated_df, label="Churn targets")
 
-aggregated_df["churn"] = calculate_churn(aggregated_df)
-
-aggregated_df = aggregated_df.reset_index()
+# Save the targets by fiscal year, and load the latest fiscal year's targets back for modeling
+write_features(aggregated_df, FEATURE_SET_NAME)
+targets_df = read_features(
+    FEATURE_SET_NAME,
+    fiscal_years=[aggregated_df["fiscal_year"].max()],
+    columns=["id", "fiscal_year"] + list(CHURN_DEFINITIONS),
+)
 
 print(aggregated_df.head(30))
+print(targets_df.head(10))
@@ -0,0 +1,105 @@
+"""Code for labelling churn directly from sorted donor-year arrays. Several churn
+definitions can be labelled in one pass, without copying or grouping the data."""
+
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+
+# Define constants used in the code below
+# Each definition has either 'lapse_years', the number of following fiscal years
+# without a gift, or 'drop_pct', the minimum drop in giving from one fiscal year
+# to the next
+NEXT_YEAR_LAPSE = {"churn": {"lapse_years": 1}}
+
+
+def _values(df: pd.DataFrame, name: str) -> np.ndarray:
+    if name in df.columns:
+        return df[name].to_numpy()
+    return df.index.get_level_values(name).to_numpy()
+
+
+def label_churn(
+    df: pd.DataFrame,
+    definitions: Dict[str, Dict[str, Union[int, float]]] = NEXT_YEAR_LAPSE,
+    id_column: str = "id",
+    fiscal_year: str = "fiscal_year",
+    amount: str = "amount_given",
+) -> pd.DataFrame:
+    """Label donor-years as churned under one or more churn definitions.
+
+        A donor-year can only churn if the donor gave that year. With
+        'lapse_years': N, it churns if the donor gives nothing in the next
+        N fiscal years. With 'drop_pct': p, it churns if the next fiscal
+        year's giving is at most (1 - p) times this year's giving, so
+        'drop_pct': 1 is the same as 'lapse_years': 1. Fiscal years after
+        the last one in the data count as years without gifts.
+
+        Rather than grouping by donor, each row is compared with the rows
+        after it, and a boundary mask drops comparisons that cross from
+        one donor to the next. Missing fiscal years do not need to be
+        filled first, since the fiscal years themselves are compared.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame containing grouped and aggregated
+            giving data, sorted by donor ID and fiscal year. The ID and
+            fiscal year may be columns or index levels.
+
+    Keyword Arguments:
+        definitions {Dict[str, Dict[str, Union[int, float]]]} -- Names of the
+            label columns mapped to their churn definitions (default: {NEXT_YEAR_LAPSE})
+        id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
+        fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
+        amount {str} -- Name of the column containing the amount given (default: {'amount_given'})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with the same index as `df` and one column
+            of 1s and 0s per churn definition
+    """
+    ids = _values(df, id_column)
+    years = _values(df, fiscal_year)
+    amounts = _values(df, amount).astype(float)
+    n_rows = len(ids)
+    same_donor = ids[1:] == ids[:-1]
+    out_of_order = (~same_donor & (ids[1:] < ids[:-1])) | (same_donor & (years[1:] <= years[:-1]))
+    if out_of_order.any():
+        raise ValueError(
+            f"Data must be sorted by {id_column} and {fiscal_year} with no duplicates."
+        )
+
+    max_lapse_years = 1
+    for name, definition in definitions.items():
+        if set(definition) == {"lapse_years"}:
+            max_lapse_years = max(max_lapse_years, int(definition["lapse_years"]))
+        elif set(definition) != {"drop_pct"}:
+            raise ValueError(f"Churn definition {name} needs either 'lapse_years' or 'drop_pct'.")
+
+    # Compare each row with the rows up to `max_lapse_years` after it. Years are
+    # unique within a donor, so a gift within N years must be within N rows.
+    gave = amounts > 0
+    years_ahead = []
+    gave_ahead = []
+    for lag in range(1, max_lapse_years + 1):
+        gap = np.full(n_rows, np.iinfo(np.int64).max)
+        later_gift = np.zeros(n_rows, dtype=bool)
+        if lag < n_rows:
+            same_donor = ids[lag:] == ids[:-lag]
+            gap[:-lag] = np.where(same_donor, years[lag:] - years[:-lag], gap[:-lag])
+            later_gift[:-lag] = same_donor & gave[lag:]
+        years_ahead.append(gap)
+        gave_ahead.append(later_gift)
+    next_year_amount = np.where(years_ahead[0] == 1, np.append(amounts[1:], 0)[:n_rows], 0)
+
+    labels = {}
+    for name, definition in definitions.items():
+        if "lapse_years" in definition:
+            lapse_years = int(definition["lapse_years"])
+            gave_later = np.zeros(n_rows, dtype=bool)
+            for gap, later_gift in zip(years_ahead[:lapse_years], gave_ahead[:lapse_years]):
+                gave_later |= later_gift & (gap <= lapse_years)
+            churned = gave & ~gave_later
+        else:
+            churned = gave & (next_year_amount <= amounts * (1 - definition["drop_pct"]))
+        labels[name] = churned.astype(int)
+    return pd.DataFrame(labels, index=df.index)
@@ -2,13 +2,18 @@
 
 import datetime
 import dateutil
-from typing import Callable, Any
+from typing import Callable, Any, Sequence
 
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
+from donor_years import fill_donor_year_ranges
+from feature_store import read_features, write_features
+from schema import apply_schema
+from synthetic_data import generate_gift_history
+
 
 # Define constants used in the code below
 RANDOM_SEED = 888
@@ -19,28 +24,12 @@ YEARS = [year for year in range(1990, 2022)]
 CURRENT_FISCAL_YEAR = (
     datetime.datetime.now() + dateutil.relativedelta.relativedelta(months=6)
 ).year
+DIFFERENCE_NAMES = {1: "acceleration", 2: "jerk"}
+FEATURE_SET_NAME = "donor_year_features"
 
 
-# Set random seed for reproducible results
-np.random.seed(RANDOM_SEED)
-
 # Create dataset
-df = pd.DataFrame()
-
-for donor_id in range(ID_COUNT):
-    start_year = np.random.choice(YEARS)
-    donor_years = list(range(start_year, 2022))
-    years_given = np.ma.array(
-        donor_years, mask=(np.array([np.random.random() for _ in donor_years]) < NULL_PCT)
-    ).compressed()
-    years_given = np.repeat(
-        years_given, np.random.randint(1, MAX_GIFTS_PER_YEAR, size=len(years_given))
-    )
-    gifts = np.round(np.random.exponential(scale=250, size=len(years_given)), 2)
-    temp_df = pd.DataFrame(
-        data={"id": donor_id + 1000, "fiscal_year": years_given, "amount_given": gifts}
-    )
-    df = pd.concat([df, temp_df], ignore_index=True)
+df = generate_gift_history(ID_COUNT, YEARS, NULL_PCT, MAX_GIFTS_PER_YEAR, seed=RANDOM_SEED)
 
 
 # Aggregate data
@@ -52,6 +41,7 @@ df = (
     )
     .reset_index()
 )
+df = apply_schema(df, label="Aggregated gifts")
 
 
 # Functions to calculate velocities and accelerations for all fiscal years
@@ -195,11 +185,88 @@ def calculate_acceleration(
     return acceleration
 
 
+def _lagged_difference(values: np.ndarray, ids: np.ndarray, lag: int) -> np.ndarray:
+    """Subtract each row from the row `lag` rows after it, within sorted donor IDs."""
+    result = np.full(values.shape, np.nan)
+    if lag < len(values):
+        result[lag:] = values[lag:] - values[:-lag]
+        result[lag:][ids[lag:] != ids[:-lag]] = np.nan
+    return result
+
+
+def calculate_accelerations(
+    df: pd.DataFrame,
+    id_column: str = "id",
+    velocity_columns: Sequence[str] = ("simple_velocity", "rolling_velocity"),
+    lags: Sequence[int] = (1,),
+    max_order: int = 1,
+) -> pd.DataFrame:
+    """Calculate accelerations, and optionally higher order differences, for several velocities.
+
+        Every velocity column is differenced at once as one 2D array,
+        rather than with a separate groupby per column. When the data is
+        sorted by donor, which it is after fill_missing_fiscal_years, a
+        boundary mask stands in for the groupby: a difference is dropped
+        when the rows come from different donors. Otherwise a single
+        groupby differences all columns together.
+
+        Each velocity column's name has '_velocity' replaced by the name
+        of the difference, e.g. 'simple_acceleration' and 'simple_jerk'.
+        Lags other than 1 add a suffix, e.g. 'simple_acceleration_2_year'.
+        A first order difference with a lag of 1 is the same as
+        calculate_acceleration.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame that contains, at a minimum, an
+            ID column and the velocity columns.
+
+    Keyword Arguments:
+        id_column {str} -- Name of the ID column (default: {'id'})
+        velocity_columns {Sequence[str]} -- Names of the velocity columns
+            (default: {('simple_velocity', 'rolling_velocity')})
+        lags {Sequence[int]} -- Numbers of rows (fiscal years) to difference
+            across (default: {(1,)})
+        max_order {int} -- The highest order of difference, e.g. 2 for
+            acceleration and jerk (default: {1})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with the same index as `df` containing
+            every difference for every velocity column
+    """
+    ids = df[id_column].to_numpy()
+    values = df[list(velocity_columns)].to_numpy(dtype=float)
+    is_sorted = bool(np.all(ids[1:] >= ids[:-1]))
+    bases = [column.replace("_velocity", "") for column in velocity_columns]
+
+    differences = {}
+    for lag in lags:
+        differenced = values
+        for order in range(1, max_order + 1):
+            if is_sorted:
+                differenced = _lagged_difference(differenced, ids, lag)
+            else:
+                differenced = pd.DataFrame(differenced).groupby(ids).diff(lag).to_numpy()
+            suffix = DIFFERENCE_NAMES.get(order, f"difference_{order}")
+            if lag != 1:
+                suffix = f"{suffix}_{lag}_year"
+            for base, column in zip(bases, differenced.T):
+                differences[(order, lag, base)] = (f"{base}_{suffix}", column)
+
+    # Order columns by difference, then lag, then velocity column
+    result = pd.DataFrame(
+        {name: column for _, (name, column) in sorted(differences.items(), key=lambda x: x[0][:2])},
+        index=df.index,
+    )
+    result = result.fillna(0)
+    return result
+
+
 def fill_missing_fiscal_years(
     df: pd.DataFrame,
     id_column: str = "id",
     fiscal_year: str = "fiscal_year",
     amount: str = "amount_given",
+    unstack: bool = False,
 ) -> pd.DataFrame:
     """Add fiscal years in which donors did not give to the DataFrame.
 
@@ -208,6 +275,11 @@ def fill_missing_fiscal_years(
         first gift. This code does that, and fills the newly-created
         data points with a value of 0.
 
+        By default only each donor's range of fiscal years is built (see
+        donor_years.py). Unstacking builds every donor in every fiscal
+        year before dropping the years before each donor's first gift,
+        which runs out of memory for large donor bases.
+
     Arguments:
         df {pd.DataFrame} -- A DataFrame containing grouped and
             aggregated giving data.
@@ -216,10 +288,14 @@ def fill_missing_fiscal_years(
         id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
         fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
         amount {str} -- Name of the column containing the amount given (default: {'amount_given'})
+        unstack {bool} -- Use the original unstack/stack approach, kept for
+            verifying results (default: {False})
 
     Returns:
         pd.DataFrame -- A DataFrame with missing fiscal years added
     """
+    if not unstack:
+        return fill_donor_year_ranges(df, id_column, fiscal_year)
     temp_df = df.set_index([id_column, fiscal_year]).copy()
     temp_df = temp_df.unstack(level=[fiscal_year], fill_value=0).stack(
         level=[fiscal_year], dropna=False
@@ -278,23 +354,123 @@ def apply_to_all_years(
     return df_to_join
 
 
-def add_velocities(df):
+def _window_sum(matrix: np.ndarray, first_lag: int, last_lag: int) -> np.ndarray:
+    """Sum the columns of an id x year matrix over a trailing window of lags.
+
+    Arguments:
+        matrix {np.ndarray} -- A 2D array with one row per donor and one
+            column per consecutive fiscal year.
+        first_lag {int} -- The most recent lag in the window, where 0 is
+            the current year.
+        last_lag {int} -- The oldest lag in the window.
+
+    Returns:
+        np.ndarray -- An array of the same shape containing the window sums
+    """
+    result = np.zeros_like(matrix)
+    n_years = matrix.shape[1]
+    for lag in range(first_lag, min(last_lag, n_years - 1) + 1):
+        result[:, lag:] += matrix[:, : n_years - lag]
+    return result
+
+
+def calculate_velocities(
+    df: pd.DataFrame,
+    start_year: int,
+    end_year: int = CURRENT_FISCAL_YEAR,
+    fiscal_year: str = "fiscal_year",
+    id_column: str = "id",
+    amount: str = "amount_given",
+    simple_window: int = 5,
+    rolling_window: int = 3,
+) -> pd.DataFrame:
+    """Calculate simple and rolling velocity for every fiscal year in one pass.
+
+        Gives the same results as running calculate_simple_velocity and
+        calculate_rolling_velocity through apply_to_all_years, but
+        instead of filtering and grouping the whole DataFrame once per
+        year, giving is spread into a dense id x fiscal year matrix.
+        Total giving is a cumulative sum across that matrix and the
+        velocity windows are sums of shifted columns, so every year is
+        calculated at once.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame containing grouped and
+            aggregated giving data.
+        start_year {int} -- The first fiscal year to calculate velocities for
+
+    Keyword Arguments:
+        end_year {int} -- The last fiscal year to calculate velocities for
+            (default: {CURRENT_FISCAL_YEAR})
+        fiscal_year {str} -- Name of the column containing the
+            fiscal year (default: {'fiscal_year'})
+        id_column {str} -- Name of the column containing the
+            donor's ID (default: {'id'})
+        amount {str} -- Name of the column containing the amount
+            given (default: {'amount_given'})
+        simple_window {int} -- The number of years in the numerator of
+            the simple velocity (default: {5})
+        rolling_window {int} -- The number of years in the denominator of
+            the rolling velocity (default: {3})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with the same index as `df` containing
+            the 'simple_velocity' and 'rolling_velocity' columns
+    """
+    codes, unique_ids = pd.factorize(df[id_column])
+    years = df[fiscal_year].to_numpy()
+    first_year = years.min()
+    n_years = years.max() - first_year + 1
+    cells = codes * n_years + (years - first_year)
+    shape = (len(unique_ids), n_years)
+
+    amounts = df[amount].to_numpy(dtype=float)
+    has_amount = ~np.isnan(amounts)
+    giving = np.bincount(
+        cells[has_amount], weights=amounts[has_amount], minlength=shape[0] * shape[1]
+    ).reshape(shape)
+    gift_rows = np.bincount(cells[has_amount], minlength=shape[0] * shape[1]).reshape(shape)
+    any_rows = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        recent_giving = _window_sum(giving, 0, simple_window).ravel()[cells]
+        total_giving = np.cumsum(giving, axis=1).ravel()[cells]
+        simple_velocity = recent_giving / total_giving
+
+        prev_fy_giving = _window_sum(giving, 1, 1).ravel()[cells]
+        rolling_mean = (
+            _window_sum(giving, 1, rolling_window).ravel()[cells]
+            / _window_sum(gift_rows, 1, rolling_window).ravel()[cells]
+        )
+        rolling_velocity = prev_fy_giving / rolling_mean
+    # Donors without a row in the previous year are absent from the per-year calculation
+    rolling_velocity[_window_sum(any_rows, 1, 1).ravel()[cells] == 0] = np.nan
+
+    velocity_df = pd.DataFrame(
+        {"simple_velocity": simple_velocity, "rolling_velocity": rolling_velocity},
+        index=df.index,
+    )
+    velocity_df[(years < start_year) | (years > end_year)] = np.nan
+    velocity_df = velocity_df.fillna(0)
+    return velocity_df
+
+
+def add_velocities(df, vectorized=True):
     result = df.copy()
-    for func in [calculate_simple_velocity, calculate_rolling_velocity]:
-        temp_df = apply_to_all_years(result, func, result["fiscal_year"].min())
-        result = result.join(temp_df, on=["id", "fiscal_year"])
+    if vectorized:
+        result = result.join(calculate_velocities(result, result["fiscal_year"].min()))
+    else:
+        # Original per-year calculation, kept for verifying the vectorized results
+        for func in [calculate_simple_velocity, calculate_rolling_velocity]:
+            temp_df = apply_to_all_years(result, func, result["fiscal_year"].min())
+            result = result.join(temp_df, on=["id", "fiscal_year"])
     result = result.fillna(0)
     return result
 
 
-def add_accelerations(df):
+def add_accelerations(df, lags=(1,), max_order=1):
     result = df.copy()
-    velocity_dict = {
-        "simple_velocity": "simple_acceleration",
-        "rolling_velocity": "rolling_acceleration",
-    }
-    for velocity, acceleration in velocity_dict.items():
-        result[acceleration] = calculate_acceleration(result, "id", velocity, acceleration)
+    result = result.join(calculate_accelerations(result, "id", lags=lags, max_order=max_order))
     return result
 
 
@@ -302,5 +478,10 @@ def add_accelerations(df):
 df = fill_missing_fiscal_years(df)
 df = add_velocities(df)
 df = add_accelerations(df)
+df = apply_schema(df, label="Donor-year features")
+
+# Save the features by fiscal year, so later steps can load only the years and columns they need
+write_features(df, FEATURE_SET_NAME)
+latest_df = read_features(FEATURE_SET_NAME, fiscal_years=[df["fiscal_year"].max()])
 
 df.head(20)
@@ -0,0 +1,129 @@
+"""Code for adding the fiscal years in which donors did not give, without building
+the full id x fiscal year grid."""
+
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def iter_donor_year_ranges(
+    df: pd.DataFrame,
+    id_column: str = "id",
+    fiscal_year: str = "fiscal_year",
+    memory_budget: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield each donor's fiscal years from their first gift to the last fiscal year.
+
+        Unstacking and restacking the data builds a row for every donor
+        in every fiscal year, and only then drops the years before each
+        donor's first gift. Here each donor's range of fiscal years is
+        built directly with np.repeat and np.arange, and the existing
+        rows are scattered into it by position. Fiscal years with no
+        data points are filled with a value of 0.
+
+        The result has the same rows, columns, dtypes and index as the
+        unstack/stack approach. The index is the row's position in the
+        full id x fiscal year grid, even though that grid is never built.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame containing grouped and
+            aggregated giving data, with one row per donor and fiscal year.
+
+    Keyword Arguments:
+        id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
+        fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
+        memory_budget {Optional[int]} -- Approximate number of bytes each
+            yielded DataFrame may use. Donors are split into batches to
+            stay within it. By default all donors are yielded at once
+            (default: {None})
+
+    Yields:
+        pd.DataFrame -- Batches of donors with missing fiscal years added
+    """
+    if df.duplicated([id_column, fiscal_year]).any():
+        raise ValueError(f"Each {id_column} and {fiscal_year} pair must appear only once.")
+    value_columns = [column for column in df.columns if column not in (id_column, fiscal_year)]
+
+    codes, unique_ids = pd.factorize(df[id_column], sort=True)
+    all_years = np.sort(df[fiscal_year].unique())
+    n_years = len(all_years)
+    year_positions = np.searchsorted(all_years, df[fiscal_year].to_numpy())
+
+    # Each donor's rows start at their first gift year and run to the last fiscal year
+    first_positions = pd.Series(year_positions).groupby(codes).min().to_numpy()
+    counts = n_years - first_positions
+    ends = np.cumsum(counts)
+    offsets = ends - counts
+    targets = offsets[codes] + year_positions - first_positions[codes]
+    order = np.argsort(codes, kind="stable")
+    row_starts = np.searchsorted(codes[order], np.arange(len(unique_ids) + 1))
+
+    if memory_budget is None:
+        rows_per_batch = int(ends[-1]) if len(ends) else 0
+    else:
+        bytes_per_row = 8 + sum(
+            df[column].dtype.itemsize if isinstance(df[column].dtype, np.dtype) else 8
+            for column in df.columns
+        )
+        rows_per_batch = max(1, memory_budget // bytes_per_row)
+
+    first = 0
+    while first < len(unique_ids):
+        last = int(np.searchsorted(ends, offsets[first] + rows_per_batch, side="right"))
+        last = max(last, first + 1)
+        batch_start = offsets[first]
+        n_rows = ends[last - 1] - batch_start
+
+        batch_codes = np.repeat(np.arange(first, last), counts[first:last])
+        batch_positions = (
+            np.arange(n_rows)
+            - np.repeat(offsets[first:last] - batch_start, counts[first:last])
+            + np.repeat(first_positions[first:last], counts[first:last])
+        )
+        source_rows = np.full(n_rows, -1)
+        batch_rows = order[row_starts[first] : row_starts[last]]
+        source_rows[targets[batch_rows] - batch_start] = batch_rows
+
+        result = pd.DataFrame(
+            {
+                id_column: unique_ids.take(batch_codes),
+                fiscal_year: all_years[batch_positions],
+            },
+            index=batch_codes * n_years + batch_positions,
+        )
+        for column in value_columns:
+            result[column] = pd.api.extensions.take(
+                df[column].to_numpy(), source_rows, allow_fill=True, fill_value=0
+            )
+        yield result
+        first = last
+
+
+def fill_donor_year_ranges(
+    df: pd.DataFrame,
+    id_column: str = "id",
+    fiscal_year: str = "fiscal_year",
+) -> pd.DataFrame:
+    """Add fiscal years in which donors did not give to the DataFrame.
+
+        Gives the same results as unstacking and restacking the fiscal
+        years and dropping the rows before each donor's first gift, but
+        only ever builds the rows that are kept. See
+        iter_donor_year_ranges for details. The whole result is built at
+        once; to bound memory, process the batches from
+        iter_donor_year_ranges with a memory_budget one at a time instead.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame containing grouped and
+            aggregated giving data.
+
+    Keyword Arguments:
+        id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
+        fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with missing fiscal years added
+    """
+    # Without a memory budget, every donor is yielded in one batch
+    return next(iter_donor_year_ranges(df, id_column, fiscal_year), df.iloc[:0])
@@ -0,0 +1,156 @@
+"""Code for saving engineered donor-year features to disk and loading them back.
+
+Features are stored as Parquet files partitioned by fiscal year, so loading a
+single fiscal year or a few columns only reads the files and columns needed."""
+
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from schema import apply_schema
+
+
+# Define constants used in the code below
+FEATURE_STORE_PATH = "feature_store"
+PARTITION_COLUMN = "fiscal_year"
+# Files starting with '_' are skipped when reading the dataset
+SCHEMA_FILENAME = "_schema.arrow"
+
+
+def _partitioning(schema: pa.Schema) -> ds.Partitioning:
+    field = schema.field(PARTITION_COLUMN)
+    return ds.partitioning(pa.schema([field]), flavor="hive")
+
+
+def _read_schema(path: Path) -> Optional[pa.Schema]:
+    schema_path = path / SCHEMA_FILENAME
+    if not schema_path.exists():
+        return None
+    return pa.ipc.read_schema(pa.py_buffer(schema_path.read_bytes()))
+
+
+def _wider_type(saved: pa.DataType, new: pa.DataType) -> pa.DataType:
+    """Return a type that can hold a column saved as one type and written again as another."""
+    if saved == new:
+        return saved
+    if pa.types.is_dictionary(saved) and pa.types.is_dictionary(new):
+        return pa.dictionary(_wider_type(saved.index_type, new.index_type), saved.value_type)
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(saved) for check in numeric) and any(check(new) for check in numeric):
+        return pa.from_numpy_dtype(np.promote_types(saved.to_pandas_dtype(), new.to_pandas_dtype()))
+    return saved
+
+
+def _store_schema(saved: Optional[pa.Schema], table: pa.Table) -> pa.Schema:
+    """Return the saved schema, widened to fit the table and with any new columns added."""
+    if saved is None:
+        return table.schema
+    fields = [
+        (
+            field.with_type(_wider_type(field.type, table.schema.field(field.name).type))
+            if field.name in table.column_names
+            else field
+        )
+        for field in saved
+    ]
+    fields += [field for field in table.schema if field.name not in saved.names]
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def write_features(
+    df: pd.DataFrame,
+    name: str,
+    root: str = FEATURE_STORE_PATH,
+    compact: bool = True,
+) -> None:
+    """Save a DataFrame of donor-year features, partitioned by fiscal year.
+
+        Fiscal years in `df` replace any fiscal years already saved under
+        `name`; other fiscal years are left alone. That means a refresh of
+        the current fiscal year only rewrites that year's files.
+
+        Every fiscal year is read back with the same dtypes. Each column's
+        type is saved with the first write, and a later write whose values
+        need a wider type, e.g. a gift count over 255 that apply_schema
+        kept as uint16, widens the saved type. Years already on disk are
+        cast to it when they are read.
+
+    Arguments:
+        df {pd.DataFrame} -- A DataFrame with a 'fiscal_year' column, such as
+            the output of add_accelerations in combining.py
+        name {str} -- Name of the feature set, e.g. 'donor_year_features'
+
+    Keyword Arguments:
+        root {str} -- Directory holding every feature set (default: {FEATURE_STORE_PATH})
+        compact {bool} -- Save with the compact dtypes from schema.py (default: {True})
+    """
+    if compact:
+        df = apply_schema(df)
+    path = Path(root) / name
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = _store_schema(_read_schema(path), table)
+    table = table.cast(pa.schema([schema.field(column) for column in table.column_names]))
+    ds.write_dataset(
+        table,
+        path,
+        format="parquet",
+        partitioning=_partitioning(schema),
+        existing_data_behavior="delete_matching",
+    )
+    (path / SCHEMA_FILENAME).write_bytes(schema.serialize().to_pybytes())
+
+
+def _dataset(name: str, root: str) -> ds.Dataset:
+    path = Path(root) / name
+    schema = _read_schema(path)
+    if schema is None:
+        raise FileNotFoundError(f"No features saved under '{path}'.")
+    return ds.dataset(path, schema=schema, format="parquet", partitioning=_partitioning(schema))
+
+
+def read_features(
+    name: str,
+    fiscal_years: Optional[Iterable[int]] = None,
+    columns: Optional[List[str]] = None,
+    root: str = FEATURE_STORE_PATH,
+) -> pd.DataFrame:
+    """Load saved donor-year features, reading only the fiscal years and columns requested.
+
+    Arguments:
+        name {str} -- Name of the feature set
+
+    Keyword Arguments:
+        fiscal_years {Optional[Iterable[int]]} -- Fiscal years to load. Other
+            years' files are never opened (default: {all fiscal years})
+        columns {Optional[List[str]]} -- Columns to load (default: {all columns})
+        root {str} -- Directory holding every feature set (default: {FEATURE_STORE_PATH})
+
+    Returns:
+        pd.DataFrame -- The requested features
+    """
+    dataset = _dataset(name, root)
+    columns = dataset.schema.names if columns is None else columns
+    year_filter = None
+    if fiscal_years is not None:
+        year_filter = ds.field(PARTITION_COLUMN).isin(list(fiscal_years))
+    table = dataset.to_table(columns=columns, filter=year_filter)
+    return table.to_pandas()[columns]
+
+
+def list_fiscal_years(name: str, root: str = FEATURE_STORE_PATH) -> List[int]:
+    """List the fiscal years saved for a feature set, without reading any data."""
+    return sorted(
+        int(path.name.split("=", 1)[1])
+        for path in (Path(root) / name).glob(f"{PARTITION_COLUMN}=*")
+        if path.is_dir()
+    )
+
+
+def delete_features(name: str, root: str = FEATURE_STORE_PATH) -> None:
+    """Delete every fiscal year saved for a feature set."""
+    shutil.rmtree(Path(root) / name, ignore_errors=True)
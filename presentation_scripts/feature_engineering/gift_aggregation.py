@@ -0,0 +1,146 @@
+"""Code for aggregating a gift ledger that is too large to load into one DataFrame.
+The ledger is read in chunks, and each chunk's sums and counts by donor and fiscal
+year are merged into a running total."""
+
+import time
+from typing import Iterable, List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from chunked_io import read_chunks
+
+
+# Define constants used in the code below
+CHUNK_SIZE = 1_000_000
+
+
+class ChunkedGiftAggregator:
+    """Sum gifts by donor and fiscal year, one chunk of the gift ledger at a time.
+
+    Peak memory depends on the number of distinct donor-years plus one
+    chunk, not on the number of rows in the ledger. Partial results are
+    buffered and only merged into the running total once the buffer is
+    as large as the total, so each row is merged a constant number of
+    times on average.
+    """
+
+    def __init__(
+        self,
+        id_column: str = "id",
+        fiscal_year: str = "fiscal_year",
+        amount: str = "amount_given",
+    ) -> None:
+        self.id_column = id_column
+        self.fiscal_year = fiscal_year
+        self.amount = amount
+        self.rows_read = 0
+        self.seconds = 0.0
+        self._total: Optional[pd.DataFrame] = None
+        self._buffer: List[pd.DataFrame] = []
+        self._buffered_rows = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        start = time.perf_counter()
+        partial = chunk.groupby([self.id_column, self.fiscal_year]).agg(
+            amount_given=(self.amount, "sum"),
+            gift_count=(self.amount, "count"),
+        )
+        self._buffer.append(partial)
+        self._buffered_rows += len(partial)
+        if self._buffered_rows >= (0 if self._total is None else len(self._total)):
+            self._merge()
+        self.rows_read += len(chunk)
+        self.seconds += time.perf_counter() - start
+
+    def _merge(self) -> None:
+        if self._total is not None:
+            self._buffer.append(self._total)
+        if len(self._buffer) == 1:
+            self._total = self._buffer[0]
+        else:
+            self._total = pd.concat(self._buffer).groupby(level=[0, 1]).sum()
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def result(self) -> pd.DataFrame:
+        """Return the aggregated gifts, with the same columns as grouping the whole ledger."""
+        if self._buffer:
+            self._merge()
+        if self._total is None:
+            return pd.DataFrame(
+                columns=[self.id_column, self.fiscal_year, "amount_given", "gift_count"]
+            )
+        return self._total.sort_index().reset_index()
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_read / self.seconds if self.seconds else 0.0
+
+
+def aggregate_gift_chunks(
+    chunks: Iterable[pd.DataFrame],
+    id_column: str = "id",
+    fiscal_year: str = "fiscal_year",
+    amount: str = "amount_given",
+    total_rows: Optional[int] = None,
+) -> pd.DataFrame:
+    """Aggregate gifts by donor and fiscal year from an iterable of ledger chunks.
+
+        Gives the same result as grouping the whole ledger by donor and
+        fiscal year, summing 'amount_given' and counting gifts in
+        'gift_count'. Progress and throughput in rows per second are
+        shown while the chunks are read, and summarized at the end.
+
+    Arguments:
+        chunks {Iterable[pd.DataFrame]} -- Chunks of the gift ledger
+
+    Keyword Arguments:
+        id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
+        fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
+        amount {str} -- Name of the column containing the amount given (default: {'amount_given'})
+        total_rows {Optional[int]} -- Number of rows in the ledger, if known,
+            for the progress bar (default: {None})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with one row per donor and fiscal year
+    """
+    aggregator = ChunkedGiftAggregator(id_column, fiscal_year, amount)
+    start = time.perf_counter()
+    with tqdm(total=total_rows, unit="rows", unit_scale=True, desc="Aggregating gifts") as progress:
+        for chunk in chunks:
+            aggregator.update(chunk)
+            progress.update(len(chunk))
+    elapsed = time.perf_counter() - start
+    result = aggregator.result()
+    print(
+        f"Aggregated {aggregator.rows_read:,} gifts into {len(result):,} donor-years "
+        f"in {elapsed:.1f}s ({aggregator.rows_read / elapsed if elapsed else 0:,.0f} rows/sec)"
+    )
+    return result
+
+
+def aggregate_gift_file(
+    path: str,
+    chunksize: int = CHUNK_SIZE,
+    id_column: str = "id",
+    fiscal_year: str = "fiscal_year",
+    amount: str = "amount_given",
+) -> pd.DataFrame:
+    """Aggregate gifts by donor and fiscal year from a CSV or Parquet gift ledger.
+
+    Arguments:
+        path {str} -- Path to a .csv (optionally compressed) or .parquet file
+
+    Keyword Arguments:
+        chunksize {int} -- Number of rows read at a time (default: {CHUNK_SIZE})
+        id_column {str} -- Name of the column containing the donor's ID (default: {'id'})
+        fiscal_year {str} -- Name of the column containing the fiscal year (default: {'fiscal_year'})
+        amount {str} -- Name of the column containing the amount given (default: {'amount_given'})
+
+    Returns:
+        pd.DataFrame -- A DataFrame with one row per donor and fiscal year
+    """
+    # Reading only the columns needed for aggregation saves time and memory
+    chunks = read_chunks(path, chunksize, columns=[id_column, fiscal_year, amount])
+    return aggregate_gift_chunks(chunks, id_column, fiscal_year, amount)
@@ -0,0 +1,290 @@
+"""Code for updating the donor-year features from combining.py and the churn target
+from churn.py as new gifts arrive, without recalculating every fiscal year.
+
+Only the most recent fiscal years of giving affect the current fiscal year's
+velocities, accelerations and churn labels. IncrementalDonorFeatures keeps that
+window of giving for each donor, along with their giving before the window and
+their previous velocities, so an update only touches the donors whose gifts
+changed."""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Define constants used in the code below
+FEATURE_COLUMNS = [
+    "id",
+    "fiscal_year",
+    "amount_given",
+    "gift_count",
+    "simple_velocity",
+    "rolling_velocity",
+    "simple_acceleration",
+    "rolling_acceleration",
+    "churn",
+]
+
+
+class IncrementalDonorFeatures:
+    """Per-donor state needed to calculate the current fiscal year's features.
+
+    The state holds, for every donor, their first gift year, their total
+    giving before the window, their giving in each year of the window
+    (ending with the current fiscal year), their gift counts in the last
+    two years, and their velocities and accelerations in the previous
+    fiscal year. Results match running fill_missing_fiscal_years,
+    add_velocities, add_accelerations and the churn label from
+    churn.py on the full history.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        first_gift_year: np.ndarray,
+        total_before_window: np.ndarray,
+        giving: np.ndarray,
+        gift_count: np.ndarray,
+        previous_velocity: np.ndarray,
+        previous_acceleration: np.ndarray,
+        fiscal_year: int,
+        simple_window: int = 5,
+        rolling_window: int = 3,
+    ) -> None:
+        self.ids = ids
+        self.first_gift_year = first_gift_year
+        self.total_before_window = total_before_window
+        self.giving = giving
+        self.gift_count = gift_count
+        self.previous_velocity = previous_velocity
+        self.previous_acceleration = previous_acceleration
+        self.fiscal_year = int(fiscal_year)
+        self.simple_window = simple_window
+        self.rolling_window = rolling_window
+
+    @staticmethod
+    def window_length(simple_window: int, rolling_window: int) -> int:
+        return max(simple_window, rolling_window) + 1
+
+    @classmethod
+    def from_history(
+        cls,
+        df: pd.DataFrame,
+        fiscal_year: Optional[int] = None,
+        simple_window: int = 5,
+        rolling_window: int = 3,
+    ) -> "IncrementalDonorFeatures":
+        """Build the state from aggregated giving data.
+
+        Arguments:
+            df {pd.DataFrame} -- A DataFrame containing grouped and aggregated
+                giving data with 'id', 'fiscal_year', 'amount_given' and
+                'gift_count' columns. Missing fiscal years do not need to be filled.
+
+        Keyword Arguments:
+            fiscal_year {Optional[int]} -- The current fiscal year. Later years
+                are ignored (default: {the last fiscal year in `df`})
+            simple_window {int} -- The simple velocity window (default: {5})
+            rolling_window {int} -- The rolling velocity window (default: {3})
+
+        Returns:
+            IncrementalDonorFeatures -- The state as of `fiscal_year`
+        """
+        if fiscal_year is None:
+            fiscal_year = int(df["fiscal_year"].max())
+        df = df[df["fiscal_year"] <= fiscal_year]
+        ids, codes = np.unique(df["id"].to_numpy(), return_inverse=True)
+        years = df["fiscal_year"].to_numpy()
+        amounts = df["amount_given"].to_numpy(dtype=float)
+        counts = df["gift_count"].to_numpy()
+        first_gift_year = pd.Series(years).groupby(codes).min().to_numpy()
+
+        # Start two years back so the previous velocities and accelerations
+        # come from the same calculation as the current ones
+        length = cls.window_length(simple_window, rolling_window)
+        start_year = fiscal_year - 2
+        window_start = start_year - length + 1
+        before = years < window_start
+        total_before_window = np.bincount(
+            codes[before], weights=amounts[before], minlength=len(ids)
+        )
+        in_window = ~before & (years <= start_year)
+        giving = np.zeros((len(ids), length))
+        np.add.at(giving, (codes[in_window], years[in_window] - window_start), amounts[in_window])
+        gift_count = np.zeros((len(ids), 2), dtype=int)
+        for column, year in enumerate([start_year - 1, start_year]):
+            in_year = years == year
+            gift_count[codes[in_year], column] = counts[in_year]
+
+        state = cls(
+            ids,
+            first_gift_year,
+            total_before_window,
+            giving,
+            gift_count,
+            np.zeros((len(ids), 2)),
+            np.zeros((len(ids), 2)),
+            start_year,
+            simple_window,
+            rolling_window,
+        )
+        for year in [start_year + 1, fiscal_year]:
+            state.advance()
+            in_year = years == year
+            state.giving[codes[in_year], -1] = amounts[in_year]
+            state.gift_count[codes[in_year], -1] = counts[in_year]
+        return state
+
+    def _velocities(self, rows: np.ndarray) -> np.ndarray:
+        year = self.fiscal_year
+        giving = self.giving[rows]
+        first_gift_year = self.first_gift_year[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            recent_giving = giving[:, -(self.simple_window + 1) :].sum(axis=1)
+            total_giving = self.total_before_window[rows] + giving.sum(axis=1)
+            simple_velocity = recent_giving / total_giving
+
+            # Missing fiscal years are filled, so every year since the first gift has a row
+            rolling_rows = year - np.maximum(first_gift_year, year - self.rolling_window)
+            rolling_mean = giving[:, -(self.rolling_window + 1) : -1].sum(axis=1) / rolling_rows
+            rolling_velocity = giving[:, -2] / rolling_mean
+        rolling_velocity[first_gift_year >= year] = 0
+        velocities = np.column_stack([simple_velocity, rolling_velocity])
+        return np.nan_to_num(velocities, nan=0, posinf=np.inf, neginf=-np.inf)
+
+    def _accelerations(self, rows: np.ndarray, velocities: np.ndarray) -> np.ndarray:
+        accelerations = velocities - self.previous_velocity[rows]
+        accelerations[self.first_gift_year[rows] >= self.fiscal_year] = 0
+        return accelerations
+
+    def advance(self) -> None:
+        """Move the state to the next fiscal year, in which no donor has given yet."""
+        rows = np.arange(len(self.ids))
+        velocities = self._velocities(rows)
+        self.previous_acceleration = self._accelerations(rows, velocities)
+        self.previous_velocity = velocities
+        self.total_before_window = self.total_before_window + self.giving[:, 0]
+        self.giving = np.column_stack([self.giving[:, 1:], np.zeros(len(self.ids))])
+        self.gift_count = np.column_stack([self.gift_count[:, 1:], np.zeros(len(self.ids), int)])
+        self.fiscal_year += 1
+
+    def features(self, ids: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Return the previous and current fiscal year's features for some donors.
+
+        Keyword Arguments:
+            ids {Optional[np.ndarray]} -- Donor IDs to return (default: {all donors})
+
+        Returns:
+            pd.DataFrame -- Rows for the previous and current fiscal years,
+                with the same columns as the full feature engineering pipeline
+        """
+        rows = np.arange(len(self.ids)) if ids is None else np.searchsorted(self.ids, ids)
+        year = self.fiscal_year
+        velocities = self._velocities(rows)
+        accelerations = self._accelerations(rows, velocities)
+        giving = self.giving[rows, -2:]
+        current = pd.DataFrame(
+            {
+                "id": self.ids[rows],
+                "fiscal_year": year,
+                "amount_given": giving[:, 1],
+                "gift_count": self.gift_count[rows, 1],
+                "simple_velocity": velocities[:, 0],
+                "rolling_velocity": velocities[:, 1],
+                "simple_acceleration": accelerations[:, 0],
+                "rolling_acceleration": accelerations[:, 1],
+                # The current fiscal year has no following year to give in yet
+                "churn": (giving[:, 1] > 0).astype(int),
+            }
+        )
+        previous = pd.DataFrame(
+            {
+                "id": self.ids[rows],
+                "fiscal_year": year - 1,
+                "amount_given": giving[:, 0],
+                "gift_count": self.gift_count[rows, 0],
+                "simple_velocity": self.previous_velocity[rows, 0],
+                "rolling_velocity": self.previous_velocity[rows, 1],
+                "simple_acceleration": self.previous_acceleration[rows, 0],
+                "rolling_acceleration": self.previous_acceleration[rows, 1],
+                "churn": ((giving[:, 1] <= 0) & (giving[:, 0] > 0)).astype(int),
+            }
+        )
+        previous = previous[self.first_gift_year[rows] < year]
+        result = pd.concat([previous, current], ignore_index=True)
+        return result.sort_values(["id", "fiscal_year"], ignore_index=True)[FEATURE_COLUMNS]
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replace donors' giving in the current fiscal year and recalculate their features.
+
+            Rows are applied one fiscal year at a time, advancing the
+            state to each later year first, so a batch can mix the
+            current and following years. Changes to earlier fiscal years also change the
+            previous velocities, so rebuild the state with from_history
+            for those instead. Donors stay in the state even if their
+            only gifts are replaced with 0.
+
+        Arguments:
+            df {pd.DataFrame} -- Aggregated giving for donors whose gifts were
+                added or changed, with 'id', 'fiscal_year', 'amount_given' and
+                'gift_count' columns
+
+        Returns:
+            pd.DataFrame -- The previous and current fiscal year's features
+                for the donors in `df`
+        """
+        if (df["fiscal_year"] < self.fiscal_year).any():
+            raise ValueError(
+                f"Only gifts in fiscal year {self.fiscal_year} or later can be updated "
+                "incrementally. Use from_history to rebuild the state."
+            )
+        # Apply each fiscal year's rows before advancing to the next, so every row
+        # lands in its own year
+        for year, year_df in df.groupby("fiscal_year", sort=True):
+            while self.fiscal_year < year:
+                self.advance()
+            self._add_donors(np.setdiff1d(year_df["id"].to_numpy(), self.ids))
+            rows = np.searchsorted(self.ids, year_df["id"].to_numpy())
+            self.giving[rows, -1] = year_df["amount_given"].to_numpy(dtype=float)
+            self.gift_count[rows, -1] = year_df["gift_count"].to_numpy()
+        return self.features(np.unique(df["id"].to_numpy()))
+
+    def _add_donors(self, new_ids: np.ndarray) -> None:
+        """Insert sorted, previously unseen donor IDs, keeping every array sorted by ID."""
+        if len(new_ids) == 0:
+            return
+        n_new = len(new_ids)
+        positions = np.searchsorted(self.ids, new_ids)
+        self.ids = np.insert(self.ids, positions, new_ids)
+        self.first_gift_year = np.insert(self.first_gift_year, positions, self.fiscal_year)
+        self.total_before_window = np.insert(self.total_before_window, positions, 0)
+        for name in ["giving", "gift_count", "previous_velocity", "previous_acceleration"]:
+            values = getattr(self, name)
+            new_values = np.zeros((n_new, values.shape[1]), dtype=values.dtype)
+            setattr(self, name, np.insert(values, positions, new_values, axis=0))
+
+    def save(self, path: str) -> None:
+        """Save the state to a .npz file."""
+        np.savez_compressed(
+            path,
+            ids=self.ids,
+            first_gift_year=self.first_gift_year,
+            total_before_window=self.total_before_window,
+            giving=self.giving,
+            gift_count=self.gift_count,
+            previous_velocity=self.previous_velocity,
+            previous_acceleration=self.previous_acceleration,
+            fiscal_year=self.fiscal_year,
+            simple_window=self.simple_window,
+            rolling_window=self.rolling_window,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IncrementalDonorFeatures":
+        """Load a state saved with save."""
+        with np.load(path) as state:
+            arrays = {name: state[name] for name in state.files}
+        for name in ["fiscal_year", "simple_window", "rolling_window"]:
+            arrays[name] = int(arrays[name])
+        return cls(**arrays)
@@ -0,0 +1,172 @@
+"""Code for creating dummy gift histories to demonstrate and load test the feature
+engineering code, so each script doesn't need its own copy of the dataset builder."""
+
+import time
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from chunked_io import write_chunks
+from schema import apply_schema
+
+
+# Define constants used in the code below
+NULL_PCT = 0.15
+MAX_GIFTS_PER_YEAR = 6
+YEARS = [year for year in range(1990, 2022)]
+FIRST_ID = 1000
+GIFT_SCALE = 250
+DONORS_PER_CHUNK = 100_000
+
+
+def _repeat_ranges(counts: np.ndarray) -> np.ndarray:
+    """Return 0, 1, ..., count - 1 for each count, concatenated into one array."""
+    offsets = np.cumsum(counts) - counts
+    return np.arange(counts.sum()) - np.repeat(offsets, counts)
+
+
+def random_dates(
+    count: int, seed: Optional[int] = None, end: Optional[int] = None
+) -> np.ndarray:
+    """Create random dates between 1970 and now in one call.
+
+        Each date is the day of a second drawn uniformly from the Unix epoch
+        to `end`, the same distribution as the random_date function that
+        transformation.py used to call once per row. Days are in UTC.
+
+    Arguments:
+        count {int} -- The number of dates to create
+
+    Keyword Arguments:
+        seed {Optional[int]} -- Random seed for reproducible results. The
+            same seed and `end` give the same dates (default: {None})
+        end {Optional[int]} -- The latest Unix timestamp to draw, exclusive
+            (default: {the current time})
+
+    Returns:
+        np.ndarray -- A datetime64[D] array of dates
+    """
+    rng = np.random.default_rng(seed)
+    end = int(time.time()) if end is None else end
+    seconds = rng.integers(1, end, size=count)
+    return seconds.astype("datetime64[s]").astype("datetime64[D]")
+
+
+def iter_gift_history(
+    id_count: int,
+    years: List[int] = YEARS,
+    null_pct: float = NULL_PCT,
+    max_gifts_per_year: int = MAX_GIFTS_PER_YEAR,
+    seed: Optional[int] = None,
+    donors_per_chunk: int = DONORS_PER_CHUNK,
+) -> Iterator[pd.DataFrame]:
+    """Create a dummy gift history, one chunk of donors at a time.
+
+        Each donor starts giving in a random year and has a data point for
+        every year through the last year, except for a random `null_pct`
+        of years in which they skip giving. In each year they give, they
+        make between 1 and `max_gifts_per_year - 1` gifts with
+        exponentially distributed amounts. Every chunk is created with a
+        handful of NumPy calls rather than a loop over donors.
+
+    Arguments:
+        id_count {int} -- The number of donors to create
+
+    Keyword Arguments:
+        years {List[int]} -- Fiscal years a donor may start giving in. Every
+            donor gives through the last year (default: {YEARS})
+        null_pct {float} -- The chance of skipping giving in a year (default: {NULL_PCT})
+        max_gifts_per_year {int} -- The exclusive upper bound on the number
+            of gifts in a year (default: {MAX_GIFTS_PER_YEAR})
+        seed {Optional[int]} -- Random seed for reproducible results. The
+            same seed and `donors_per_chunk` give the same data (default: {None})
+        donors_per_chunk {int} -- The number of donors in each chunk (default: {DONORS_PER_CHUNK})
+
+    Yields:
+        pd.DataFrame -- Chunks of gifts with 'id', 'fiscal_year' and 'amount_given' columns
+    """
+    rng = np.random.default_rng(seed)
+    years = np.asarray(years)
+    last_year = years.max()
+    for first_donor in range(0, id_count, donors_per_chunk):
+        n_donors = min(donors_per_chunk, id_count - first_donor)
+        donor_ids = np.arange(first_donor, first_donor + n_donors) + FIRST_ID
+
+        # One row for every year from each donor's start year through the last year
+        start_years = rng.choice(years, size=n_donors)
+        year_counts = last_year - start_years + 1
+        donor_rows = np.repeat(np.arange(n_donors), year_counts)
+        donor_years = start_years[donor_rows] + _repeat_ranges(year_counts)
+
+        # Skip some years, then repeat each remaining year once per gift
+        given = rng.random(len(donor_years)) >= null_pct
+        donor_rows = donor_rows[given]
+        donor_years = donor_years[given]
+        gift_counts = rng.integers(1, max_gifts_per_year, size=len(donor_years))
+        donor_rows = np.repeat(donor_rows, gift_counts)
+        donor_years = np.repeat(donor_years, gift_counts)
+        gifts = np.round(rng.exponential(scale=GIFT_SCALE, size=len(donor_years)), 2)
+
+        yield apply_schema(
+            pd.DataFrame(
+                data={
+                    "id": donor_ids[donor_rows],
+                    "fiscal_year": donor_years,
+                    "amount_given": gifts,
+                }
+            )
+        )
+
+
+def generate_gift_history(
+    id_count: int,
+    years: List[int] = YEARS,
+    null_pct: float = NULL_PCT,
+    max_gifts_per_year: int = MAX_GIFTS_PER_YEAR,
+    seed: Optional[int] = None,
+    donors_per_chunk: int = DONORS_PER_CHUNK,
+) -> pd.DataFrame:
+    """Create a dummy gift history in a single DataFrame.
+
+        See iter_gift_history for details on the arguments. For millions of
+        donors, use iter_gift_history or write_gift_history instead so the
+        whole history is never held in memory.
+
+    Arguments:
+        id_count {int} -- The number of donors to create
+
+    Returns:
+        pd.DataFrame -- Gifts with 'id', 'fiscal_year' and 'amount_given' columns
+    """
+    chunks = iter_gift_history(
+        id_count, years, null_pct, max_gifts_per_year, seed, donors_per_chunk
+    )
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_gift_history(
+    path: str,
+    id_count: int,
+    years: List[int] = YEARS,
+    null_pct: float = NULL_PCT,
+    max_gifts_per_year: int = MAX_GIFTS_PER_YEAR,
+    seed: Optional[int] = None,
+    donors_per_chunk: int = DONORS_PER_CHUNK,
+) -> int:
+    """Write a dummy gift history to a CSV or Parquet file one chunk at a time.
+
+        Memory use depends on `donors_per_chunk`, not `id_count`. The file
+        can be read back in chunks with chunked_io.py.
+
+    Arguments:
+        path {str} -- Path to a .csv (optionally compressed) or .parquet file
+        id_count {int} -- The number of donors to create
+
+    Returns:
+        int -- The number of gifts written
+    """
+    chunks = iter_gift_history(
+        id_count, years, null_pct, max_gifts_per_year, seed, donors_per_chunk
+    )
+    return write_chunks(chunks, path)
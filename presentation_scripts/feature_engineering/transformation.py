@@ -1,25 +1,27 @@
 """Code for transforming data into another form without reducing the number of rows."""
 
-import datetime
-import time
-
-import numpy as np
 import pandas as pd
 
+from fiscal_calendar import benchmark_fiscal_year, fiscal_year
+from synthetic_data import random_dates
+
 # Define constants used in the code below
 RANDOM_SEED = 888
 ROW_COUNT = 1000
+BENCHMARK_ROW_COUNT = 10_000_000
 LAST_FISCAL_MONTH = 6
 
 
 # Code to create the dataset
-def random_date():
-    d = np.random.randint(1, int(time.time()))
-    return datetime.datetime.fromtimestamp(d).date()
+df = pd.DataFrame({"date": random_dates(ROW_COUNT, seed=RANDOM_SEED)})
 
 
-df = pd.DataFrame({"date": [random_date() for _ in range(ROW_COUNT)]})
+# Transform each date into a fiscal year beginning on July 1
+df["fiscal_year"] = fiscal_year(df["date"], start_month=LAST_FISCAL_MONTH + 1)
 
 
-# Transform each date into a fiscal year beginning on July 1
-df["fiscal_year"] = (pd.to_datetime(df["date"]) + pd.DateOffset(months=LAST_FISCAL_MONTH)).dt.year
+# Compare with adding a DateOffset to each date on a larger dataset. This takes several
+# seconds and about 700MB, so it only runs when the script is run directly.
+if __name__ == "__main__":
+    benchmark_dates = pd.Series(random_dates(BENCHMARK_ROW_COUNT, seed=RANDOM_SEED))
+    benchmark_fiscal_year(benchmark_dates, start_month=LAST_FISCAL_MONTH + 1)